@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+記事単位の翻訳・要約ストア（銘柄・日付をまたいで共有）
+- キー: 記事の signature（signature_for_item）
+- 値: 日本語タイトル / 要点 / 重要な理由（Gemini が一度作ったもの）
+- v5 キャッシュファイルの news セクションに保存、保持期間は news_retention_days
+- 同じ記事が別銘柄（例: DRAM価格ニュース → 創見・宇瞻）や翌日の weekly/monthly で
+  再び候補になった場合、Gemini には「選ぶだけ」を依頼し、要約は再生成しない
+"""
+
+import time
+import threading
+
+from news_cache import NewsCache, retention_sec
+
+ARTICLE_SECTION = "news"
+SUMMARY_FIELDS = ("title_ja", "title_zh", "bullets", "why_this")
+
+
+class ArticleSummaryStore:
+    """
+    値の形式: {"summary": {title_ja, title_zh, bullets, why_this}, "summarized_at": epoch秒}
+    """
+
+    def __init__(self, cache: NewsCache, ttl_sec: int | None = None):
+        self.cache = cache
+        self.ttl_sec = ttl_sec if ttl_sec is not None else retention_sec("news_retention_days", 30)
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+
+    def _summary(self, rec, now: float) -> dict | None:
+        if not isinstance(rec, dict) or not isinstance(rec.get("summary"), dict):
+            return None
+        if now - float(rec.get("summarized_at", 0)) > self.ttl_sec:
+            return None
+        return rec["summary"]
+
+    def get(self, signature: str | None) -> dict | None:
+        if not signature:
+            return None
+        summary = self._summary(self.cache.get(ARTICLE_SECTION, signature), time.time())
+        with self._lock:
+            if summary:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return summary
+
+    def lookup_many(self, items: list[dict]) -> dict[str, dict]:
+        """候補リストのうち要約済みのもの {signature: summary}"""
+        out = {}
+        for n in items:
+            sig = n.get("signature")
+            summary = self.get(sig)
+            if summary:
+                out[sig] = summary
+        return out
+
+    def put(self, signature: str | None, data: dict):
+        if not signature or not (data.get("title_ja") or "").strip():
+            return
+        rec = self.cache.get(ARTICLE_SECTION, signature)
+        rec = dict(rec) if isinstance(rec, dict) else {}
+        rec["summary"] = {k: data.get(k) for k in SUMMARY_FIELDS if data.get(k) is not None}
+        rec["summarized_at"] = time.time()
+        self.cache.put(ARTICLE_SECTION, signature, rec)
+        with self._lock:
+            self.stored += 1
+
+    def prune(self) -> int:
+        """期限切れの要約を外す（同じレコードに保持記事 item 等が残っていればレコードは残す）"""
+        now = time.time()
+        removed = 0
+        for sig, rec in self.cache.items(ARTICLE_SECTION):
+            if not isinstance(rec, dict) or "summary" not in rec or self._summary(rec, now) is not None:
+                continue
+            rest = {k: v for k, v in rec.items() if k not in ("summary", "summarized_at")}
+            if rest:
+                self.cache.put(ARTICLE_SECTION, sig, rest)
+            else:
+                self.cache.delete(ARTICLE_SECTION, sig)
+            removed += 1
+        return removed
+
+    def summary(self) -> str:
+        return (f"記事要約ストア: 再利用 {self.hits} / 未要約 {self.misses}"
+                f" / 新規保存 {self.stored}")
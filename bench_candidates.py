@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+候補選定ベンチマーク（別名テーブル → 照合器 → 全銘柄の pick_candidates_for_stock）
+
+- 合成した銘柄（既定 1,200 銘柄、各銘柄に英名・別名・除外語）と
+  1回分の収集量に相当する合成ニュース（既定 72フィード × 30件）で計測
+- 照合器のコンパイル / インデックス構築 / 全銘柄の候補選定 の時間を表示
+- 合計が予算（既定 2.0 秒）を超えたら終了コード 1
+
+使い方:
+    python3 bench_candidates.py
+    python3 bench_candidates.py --stocks 2000 --news 3000 --budget 3.0
+"""
+
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+import taiwan_stock_news_system_v5 as news_system
+
+CJK = "台積電創見宇瞻廣達聯發科鴻海華碩宏碁技嘉緯創英業達仁寶和碩南亞科華邦電旺宏群聯威剛十銓"
+WORDS = ["營收", "法說會", "AI伺服器", "DRAM價格", "先進封裝", "CoWoS", "出貨", "財測",
+         "earnings", "outlook", "supply", "chip", "memory", "server", "半導體", "供應鏈"]
+
+
+def synth_stocks(n: int, rng: random.Random) -> dict:
+    stocks = {}
+    for i in range(n):
+        sid = f"{1000 + i:04d}"
+        name = "".join(rng.choice(CJK) for _ in range(rng.randint(2, 3)))
+        en = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 9))).title()
+        stocks[sid] = {
+            "name": name,
+            "business_type": f"B2B | {rng.choice(WORDS)}",
+            "name_en": en,
+            "aliases": [en.lower(), f"{en} Corp"],
+            "exclude": [f"{en}ville"] if rng.random() < 0.1 else [],
+        }
+    return stocks
+
+
+def synth_news(n: int, stocks: dict, rng: random.Random) -> list[dict]:
+    sids = list(stocks)
+    now = datetime.now(news_system.TW_TZ)
+    news = []
+    for i in range(n):
+        mentioned = [stocks[rng.choice(sids)] for _ in range(rng.randint(0, 3))]
+        names = [rng.choice([s["name"], s["name_en"]]) for s in mentioned]
+        title = " ".join(names + rng.sample(WORDS, 3)) + f" - 媒體{i % 40}"
+        news.append({
+            "title_zh": title,
+            "snippet": " ".join(rng.sample(WORDS, 6)),
+            "publisher": f"媒體{i % 40}",
+            "published": (now - timedelta(hours=rng.randint(0, 24 * 40))).isoformat(),
+            "link": f"https://example.com/{i}",
+            "signature": f"{i:032x}",
+        })
+    return news
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stocks", type=int, default=1200)
+    ap.add_argument("--news", type=int, default=72 * 30)
+    ap.add_argument("--budget", type=float, default=2.0, help="合計時間の上限（秒）")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    stocks = synth_stocks(args.stocks, rng)
+    news = synth_news(args.news, stocks, rng)
+
+    t0 = time.perf_counter()
+    matcher = news_system.build_stock_matcher(stocks)
+    t1 = time.perf_counter()
+    index = matcher.index(news)
+    t2 = time.perf_counter()
+    total_cands = 0
+    for sid, info in stocks.items():
+        total_cands += len(news_system.pick_candidates_for_stock(news, sid, info, index=index))
+    t3 = time.perf_counter()
+
+    total = t3 - t0
+    print(f"銘柄: {len(stocks)} / ニュース: {len(news)} / パターン: {matcher.pattern_count}")
+    print(f"  照合器コンパイル : {(t1 - t0) * 1000:8.1f} ms")
+    print(f"  インデックス構築 : {(t2 - t1) * 1000:8.1f} ms")
+    print(f"  全銘柄の候補選定 : {(t3 - t2) * 1000:8.1f} ms（候補 合計 {total_cands}件）")
+    print(f"  合計             : {total * 1000:8.1f} ms（予算 {args.budget * 1000:.0f} ms）")
+
+    if total > args.budget:
+        print("❌ 予算超過")
+        return 1
+    print("✅ 予算内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+収集パイプラインのベンチマーク（Google News の代わりにローカルHTTPサーバを使う）
+
+- ローカルサーバが Google News 風の RSS（/rss/search?q=...）と、
+  記事リンク（/rss/articles/<id> → 302 → /article/<id>）を返す
+- 遅延（--latency-ms, ±50% のジッター）・エラー率（--error-rate, 503 を返す）・
+  フィード間の重複率（--dup, 共通プールから取る記事の割合）を指定可能
+- 実物の collect_news_parallel（取得 → 解決 → 重複除外）と
+  全銘柄の pick_candidates_for_stock を規模ごとに実行
+- 規模（フィード数）ごとに別プロセスで計測し、ピークRSSが前の規模の影響を受けないようにする
+- 結果: スループット / フィード取得・URL解決の p50・p95 レイテンシ / 最初の記事までの時間 / ピークRSS
+  を表示し、JSON（--out）に書き出す
+
+使い方:
+    python3 bench_ingestion.py
+    python3 bench_ingestion.py --scales 10,100 --latency-ms 50 --error-rate 0.05 --dup 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import contextlib
+import subprocess
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape
+
+DEFAULT_SCALES = "10,100,500,2000"
+WORDS = ["營收", "法說會", "AI伺服器", "DRAM價格", "先進封裝", "CoWoS", "出貨", "財測",
+         "earnings", "outlook", "supply", "chip", "memory", "server", "半導體", "供應鏈"]
+
+
+# ==========================
+# ローカル RSS サーバ
+# ==========================
+class FeedServer:
+    """Google News 風の RSS と記事リダイレクトを返すローカルサーバ（別スレッドで起動）"""
+
+    def __init__(self, items_per_feed: int = 30, latency_ms: float = 0.0,
+                 error_rate: float = 0.0, dup: float = 0.3, seed: int = 42,
+                 stock_names: list[str] | None = None):
+        self.items_per_feed = items_per_feed
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.dup = dup
+        self.seed = seed
+        self.stock_names = stock_names or ["台積電", "TSMC"]
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._now = datetime.now(timezone.utc)
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes = b"", headers: dict | None = None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _handle(self):
+                status, body, headers = server.respond(self.path)
+                self._reply(status, body, headers)
+
+            do_GET = _handle
+            do_HEAD = _handle
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def feed_urls(self, n: int) -> list[str]:
+        return [f"{self.base}/rss/search?q=feed{i}&hl=zh-TW&gl=TW&ceid=TW:zh-Hant" for i in range(n)]
+
+    def _article(self, article_id: str, rng: random.Random) -> str:
+        name = rng.choice(self.stock_names)
+        title = f"{name} {' '.join(rng.sample(WORDS, 3))} {article_id}"
+        publisher = f"媒體{int(article_id.split('-')[-1]) % 40}"
+        pub = self._now - timedelta(hours=rng.randint(0, 24 * 35))
+        return (
+            "<item>"
+            f"<title>{escape(title)} - {publisher}</title>"
+            f"<link>{self.base}/rss/articles/{article_id}</link>"
+            f"<guid isPermaLink=\"false\">{article_id}</guid>"
+            f"<pubDate>{format_datetime(pub)}</pubDate>"
+            f"<description>{escape(' '.join(rng.sample(WORDS, 6)))}</description>"
+            f"<source url=\"https://media{int(article_id.split('-')[-1]) % 40}.example.com\">{publisher}</source>"
+            "</item>"
+        )
+
+    def _rss(self, query: str) -> bytes:
+        rng = random.Random(f"{self.seed}:{query}")
+        items = []
+        for j in range(self.items_per_feed):
+            if rng.random() < self.dup:
+                # 共通プール（= 複数フィードに現れる同一記事）
+                aid = f"shared-{rng.randrange(self.items_per_feed * 20)}"
+            else:
+                aid = f"{query}-{j}"
+            items.append(self._article(aid, random.Random(f"{self.seed}:{aid}")))
+        xml = ("<?xml version=\"1.0\" encoding=\"UTF-8\"?><rss version=\"2.0\"><channel>"
+               f"<title>{escape(query)} - Google News</title>" + "".join(items) + "</channel></rss>")
+        return xml.encode("utf-8")
+
+    def respond(self, path: str) -> tuple[int, bytes, dict]:
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency * random.uniform(0.5, 1.5))
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return 503, b"", {}
+        u = urlparse(path)
+        if u.path == "/rss/search":
+            q = parse_qs(u.query).get("q", [""])[0]
+            return 200, self._rss(q), {"Content-Type": "application/rss+xml; charset=UTF-8"}
+        if u.path.startswith("/rss/articles/"):
+            aid = u.path.rsplit("/", 1)[-1]
+            return 302, b"", {"Location": f"{self.base}/article/{aid}?utm_source=bench"}
+        if u.path.startswith("/article/"):
+            return 200, b"<html></html>", {"Content-Type": "text/html"}
+        return 404, b"", {}
+
+
+# ==========================
+# 計測
+# ==========================
+def percentile(xs: list[float], p: float) -> float:
+    if not xs:
+        return 0.0
+    xs = sorted(xs)
+    k = min(len(xs) - 1, max(0, int(round(p / 100.0 * (len(xs) - 1)))))
+    return xs[k]
+
+
+def timed(fn, sink: list[float], first: list[float] | None = None, t0: float = 0.0):
+    """fn の所要時間を sink に記録するラッパー（first には最初に結果を返した時刻を記録）"""
+    def wrapper(*args, **kwargs):
+        s = time.perf_counter()
+        try:
+            r = fn(*args, **kwargs)
+        finally:
+            sink.append(time.perf_counter() - s)
+        if first is not None and r and not first:
+            first.append(time.perf_counter() - t0)
+        return r
+    return wrapper
+
+
+def run_one(args) -> dict:
+    """1規模ぶんを計測（子プロセスで実行）"""
+    import feed_fetcher
+    import taiwan_stock_news_system_v5 as news_system
+    from news_cache import NewsCache
+
+    names = [n for info in news_system.STOCKS.values()
+             for n in (info.get("name"), info.get("name_en")) if n]
+    feed_lat: list[float] = []
+    resolve_lat: list[float] = []
+    first_item: list[float] = []
+
+    with FeedServer(items_per_feed=args.items, latency_ms=args.latency_ms,
+                    error_rate=args.error_rate, dup=args.dup, seed=args.seed,
+                    stock_names=names) as server, tempfile.TemporaryDirectory() as tmp:
+        urls = server.feed_urls(args.one)
+        cache = NewsCache(os.path.join(tmp, "bench_cache.sqlite3"))
+
+        t0 = time.perf_counter()
+        feed_fetcher.fetch_feed = timed(feed_fetcher.fetch_feed, feed_lat)
+        news_system.process_rss_entry = timed(news_system.process_rss_entry, resolve_lat, first_item, t0)
+
+        # パイプラインのログは stdout（結果 JSON）に混ぜない
+        sink = sys.stderr if args.verbose else open(os.devnull, "w")
+        with contextlib.redirect_stdout(sink):
+            all_news = news_system.collect_news_parallel(max_entries_per_feed=args.items,
+                                                         cache=cache, feed_urls=urls)
+        t1 = time.perf_counter()
+
+        matcher = news_system.build_stock_matcher()
+        index = matcher.index(all_news)
+        cands = sum(len(news_system.pick_candidates_for_stock(all_news, sid, info, index=index))
+                    for sid, info in news_system.STOCKS.items())
+        t2 = time.perf_counter()
+        cache.close()
+
+        entries = len(urls) * args.items
+        collect_sec = t1 - t0
+        return {
+            "feeds": len(urls),
+            "entries": entries,
+            "items": len(all_news),
+            "candidates": cands,
+            "collect_sec": round(collect_sec, 3),
+            "pick_sec": round(t2 - t1, 4),
+            "feeds_per_sec": round(len(urls) / collect_sec, 1) if collect_sec else None,
+            "entries_per_sec": round(entries / collect_sec, 1) if collect_sec else None,
+            "first_item_sec": round(first_item[0], 3) if first_item else None,
+            "feed_latency_ms": {"p50": round(percentile(feed_lat, 50) * 1000, 1),
+                                "p95": round(percentile(feed_lat, 95) * 1000, 1)},
+            "resolve_latency_ms": {"p50": round(percentile(resolve_lat, 50) * 1000, 1),
+                                   "p95": round(percentile(resolve_lat, 95) * 1000, 1)},
+            "server_requests": server.requests,
+            "server_errors": server.errors,
+            # Linux の ru_maxrss は KB
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default=DEFAULT_SCALES, help="フィード数（カンマ区切り）")
+    ap.add_argument("--items", type=int, default=30, help="1フィードあたりの記事数")
+    ap.add_argument("--latency-ms", type=float, default=20.0, help="サーバ応答の平均遅延（ms）")
+    ap.add_argument("--error-rate", type=float, default=0.02, help="503 を返す割合")
+    ap.add_argument("--dup", type=float, default=0.3, help="フィード間で重複する記事の割合")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default="bench_ingestion.json", help="結果 JSON の出力先")
+    ap.add_argument("--verbose", action="store_true", help="パイプラインのログを表示")
+    ap.add_argument("--one", type=int, help=argparse.SUPPRESS)   # 子プロセス用: 1規模だけ計測
+    args = ap.parse_args(argv)
+
+    if args.one is not None:
+        print(json.dumps(run_one(args), ensure_ascii=False))
+        return 0
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    results = []
+    print(f"{'feeds':>6} {'entries':>8} {'items':>7} {'収集s':>8} {'entries/s':>10}"
+          f" {'初回s':>6} {'feed p50/p95 ms':>16} {'解決 p50/p95 ms':>16} {'RSS MB':>7}")
+    for n in scales:
+        cmd = [sys.executable, os.path.abspath(__file__), "--one", str(n),
+               "--items", str(args.items), "--latency-ms", str(args.latency_ms),
+               "--error-rate", str(args.error_rate), "--dup", str(args.dup), "--seed", str(args.seed)]
+        if args.verbose:
+            cmd.append("--verbose")
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True,
+                              stderr=None if args.verbose else subprocess.PIPE,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+        if proc.returncode != 0:
+            print(f"❌ {n}フィードの計測に失敗: {(proc.stderr or '').strip()[-500:]}")
+            return 1
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(r)
+        fl, rl = r["feed_latency_ms"], r["resolve_latency_ms"]
+        print(f"{r['feeds']:>6} {r['entries']:>8} {r['items']:>7} {r['collect_sec']:>8.2f}"
+              f" {r['entries_per_sec'] or 0:>10.0f} {r['first_item_sec'] or 0:>6.2f}"
+              f" {fl['p50']:>7.0f}/{fl['p95']:<8.0f} {rl['p50']:>7.1f}/{rl['p95']:<8.1f}"
+              f" {r['peak_rss_mb']:>7.1f}", flush=True)
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "config": {"items_per_feed": args.items, "latency_ms": args.latency_ms,
+                   "error_rate": args.error_rate, "dup": args.dup, "seed": args.seed},
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ 結果を書き出しました: {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時間ベンチマーク（python -X importtime）
+
+- 対象モジュールを新しいプロセスで import し、-X importtime の出力から
+  import 合計時間と重いモジュール上位を表示
+- 同じ import を --runs 回実行したプロセス全体の経過時間（中央値）も計測
+- 重い SDK（sendgrid / google.genai / openai / feedparser / dateutil / pytz / requests）が
+  起動時に読み込まれていたら警告（使う段階で import する方針のため）
+- いずれかの対象が予算（既定 300ms）を超えたら終了コード 1
+
+使い方:
+    python3 bench_startup.py
+    python3 bench_startup.py --modules clear_cache,news_cache --budget-ms 150 --top 15
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODULES = "taiwan_stock_news_system_v5,clear_cache,news_clustering_v51"
+HEAVY_SDKS = ("sendgrid", "google.genai", "openai", "feedparser", "dateutil", "pytz", "requests")
+
+
+def import_profile(module: str) -> tuple[int, list[tuple[int, int, str]]]:
+    """
+    Returns:
+        (import 合計 µs, [(self µs, cumulative µs, モジュール名), ...])
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:       123 |        456 |   name"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((int(self_us), int(cum_us), name.rstrip()))
+        except ValueError:
+            continue
+    # 先頭インデントの無い行 = トップレベル import。その累積の合計が全体
+    total = sum(cum for _, cum, name in rows if not name.startswith("  "))
+    return total, rows
+
+
+def wall_time_ms(module: str, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], cwd=BASE_DIR,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modules", default=DEFAULT_MODULES, help="対象モジュール（カンマ区切り）")
+    ap.add_argument("--runs", type=int, default=5, help="経過時間の計測回数")
+    ap.add_argument("--top", type=int, default=10, help="重い import の表示件数")
+    ap.add_argument("--budget-ms", type=float, default=300.0, help="import 合計時間の上限（ms）")
+    args = ap.parse_args(argv)
+
+    over = False
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        try:
+            total_us, rows = import_profile(module)
+        except RuntimeError as e:
+            print(f"❌ {module}: import 失敗 - {e}")
+            over = True
+            continue
+        wall = wall_time_ms(module, args.runs)
+        ok = total_us / 1000 <= args.budget_ms
+        over |= not ok
+        mark = "✅" if ok else "❌"
+        print(f"{mark} {module}: import {total_us / 1000:.1f}ms / プロセス全体 {wall:.1f}ms"
+              f"（予算 {args.budget_ms:.0f}ms）")
+        for self_us, cum_us, name in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+            print(f"    {cum_us / 1000:8.1f}ms（自身 {self_us / 1000:6.1f}ms）  {name.strip()}")
+        loaded = {name.strip() for _, _, name in rows}
+        heavy = [m for m in HEAVY_SDKS if m in loaded]
+        if heavy:
+            print(f"  ⚠️ 起動時に読み込まれている SDK: {', '.join(heavy)}")
+
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
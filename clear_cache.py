@@ -4,16 +4,26 @@
 台湾株ニュース配信システム v5.0 キャッシュクリアスクリプト
 
 【重要】
-- このスクリプトはニュースキャッシュと論点キャッシュのみをクリアします
+- このスクリプトはニュースキャッシュ・論点キャッシュ・URLマッピング・フィードキャッシュ・LLM応答キャッシュのみをクリアします
 - HTMLテンプレート、銘柄プロファイル、除外ルール、デザイン設定は一切変更しません
 - キャッシュクリア後の初回配信は通常通り v5.0 仕様で出力されます
+- キャッシュは SQLite のため、件数確認・削除はファイル全体を読み込まずに行います
 """
 
-import json
 import os
-from datetime import datetime
 
-CACHE_FILE = "/home/ubuntu/.taiwan_stock_news_cache_v5.json"
+from news_cache import CACHE_PATH, NewsCache
+
+CACHE_FILE = CACHE_PATH
+LEGACY_JSON_FILE = os.path.splitext(CACHE_FILE)[0] + ".json"
+
+SECTION_LABELS = [
+    ("news", "ニュースキャッシュ"),
+    ("topics", "論点キャッシュ"),
+    ("url_to_signature", "URLマッピング"),
+    ("feeds", "フィードキャッシュ"),
+    ("llm_responses", "LLM応答キャッシュ"),
+]
 
 def clear_cache():
     """ニュースキャッシュと論点キャッシュをクリア"""
@@ -22,44 +32,28 @@ def clear_cache():
     print("台湾株ニュース配信システム v5.0 - キャッシュクリア")
     print("=" * 60)
     
-    # 既存キャッシュの確認
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                cache = json.load(f)
-            
-            news_count = len(cache.get('news', {}))
-            topic_count = len(cache.get('topics', {}))
-            url_count = len(cache.get('url_to_signature', {}))
-            
-            print(f"\n現在のキャッシュ:")
-            print(f"  ニュースキャッシュ: {news_count}件")
-            print(f"  論点キャッシュ: {topic_count}件")
-            print(f"  URLマッピング: {url_count}件")
-            
-        except Exception as e:
-            print(f"⚠️  キャッシュ読み込みエラー: {e}")
-            cache = {}
-    else:
+    # 旧形式（同名の .json）が残っていれば、開いた時点で取り込まれる → 取り込んでからクリアする
+    # （残したままだと次回の NewsCache() で復活してしまう）
+    if not os.path.exists(CACHE_FILE) and not os.path.exists(LEGACY_JSON_FILE):
+        # 開くと空のデータベース（と親ディレクトリ）を作ってしまうので何もしない
         print("\nキャッシュファイルが存在しません")
-        cache = {}
-    
-    # キャッシュをクリア
-    new_cache = {
-        "news": {},
-        "topics": {},
-        "url_to_signature": {},
-        "cleared_at": datetime.now().isoformat(),
-        "cleared_by": "clear_cache.py"
-    }
+        return
     
-    # 保存
     try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(new_cache, f, ensure_ascii=False, indent=2)
+        cache = NewsCache(CACHE_FILE)
+        
+        # 既存キャッシュの確認
+        print(f"\n現在のキャッシュ:")
+        for sec, label in SECTION_LABELS:
+            print(f"  {label}: {cache.count(sec)}件")
+        
+        # キャッシュをクリア（1トランザクション）
+        cache.clear([sec for sec, _ in SECTION_LABELS], cleared_by="clear_cache.py")
+        cleared_at = cache.get_meta("cleared_at")
+        cache.close()
         
         print("\n✅ キャッシュクリア完了")
-        print(f"  クリア日時: {new_cache['cleared_at']}")
+        print(f"  クリア日時: {cleared_at}")
         print("\n【確認事項】")
         print("  ✓ HTMLテンプレート: 変更なし")
         print("  ✓ 銘柄プロファイル: 変更なし")
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+RSSフィード並列取得モジュール
+- 全フィードを同時にダウンロード（接続プール・ホスト単位の同時接続数制限は http_pool）
+- iter_feeds は届いたフィードから順に返す（ストリーミング）
+- タイムアウト + 指数バックオフ付きリトライ
+- フィードごとの取得レイテンシをログ出力
+- ETag / Last-Modified による条件付きGET（304 ならキャッシュ済み entries を再利用）
+- 取得結果は feedparser の entries をそのまま返す（後段の処理は無変更）
+- feedparser / dateutil は使う段階で import（起動を軽くする）
+"""
+
+import time
+import random
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+from http_pool import get_pool
+from pipeline import bounded_imap_unordered
+from metrics import METRICS
+
+# ==========================
+# 取得パラメータ
+# ==========================
+FEED_TIMEOUT = 10          # 1リクエストあたりのタイムアウト（秒）
+FEED_RETRIES = 2           # 失敗時の再試行回数（初回を除く）
+FEED_BACKOFF = 0.5         # バックオフ基準秒（0.5, 1.0, 2.0 ... + ジッター）
+FEED_MAX_WORKERS = 16      # 全体の同時取得数
+
+# 再試行する HTTP ステータス（それ以外の 4xx は即失敗）
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# フィードキャッシュに保存する entry のフィールド（process_rss_entry が参照するもの）
+CACHED_ENTRY_FIELDS = ("title", "link", "id", "summary", "published")
+
+
+class FeedFetchError(Exception):
+    """再試行しても取得できなかったフィード"""
+
+
+def _backoff_sleep(attempt: int, backoff: float):
+    time.sleep(backoff * (2 ** attempt) + random.uniform(0, backoff))
+
+
+def parse_feed_date(value: str | None) -> datetime | None:
+    """
+    RSS の日時文字列 → datetime
+    pubDate（RFC 822）は標準ライブラリで解析し、それ以外の形式だけ dateutil を使う
+    """
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        pass
+    try:
+        from dateutil import parser as date_parser
+        return date_parser.parse(value)
+    except Exception:
+        return None
+
+
+def entry_to_cache(entry) -> dict:
+    d = {k: entry.get(k) for k in CACHED_ENTRY_FIELDS if entry.get(k) is not None}
+    src = entry.get("source")
+    if src:
+        d["source"] = {"title": src.get("title"), "href": src.get("href")}
+    return d
+
+
+def entry_from_cache(d: dict):
+    import feedparser
+    entry = feedparser.FeedParserDict(d)
+    if isinstance(d.get("source"), dict):
+        entry["source"] = feedparser.FeedParserDict(d["source"])
+    return entry
+
+
+def fetch_feed(feed_url: str,
+               cache=None,
+               timeout: float = FEED_TIMEOUT,
+               retries: int = FEED_RETRIES,
+               backoff: float = FEED_BACKOFF) -> tuple[list, bool]:
+    """
+    1フィードを取得して entries を返す
+
+    Args:
+        cache: NewsCache（None ならキャッシュなしで毎回取得）
+
+    Returns:
+        (entries, not_modified)  ※ not_modified=True は 304 でキャッシュを再利用した場合
+
+    Raises:
+        FeedFetchError: 再試行後も失敗した場合
+    """
+    import feedparser
+    pool = get_pool()
+    cached = cache.get("feeds", feed_url) if cache is not None else None
+
+    headers = {"User-Agent": feedparser.USER_AGENT}
+    if cached and cached.get("entries") is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    last_error = None
+
+    for attempt in range(retries + 1):
+        try:
+            r = pool.get(feed_url, timeout=timeout, headers=headers)
+            if r.status_code == 304 and cached:
+                return [entry_from_cache(d) for d in cached["entries"]], True
+            if r.status_code in RETRY_STATUS:
+                last_error = f"HTTP {r.status_code}"
+            elif r.status_code >= 400:
+                raise FeedFetchError(f"HTTP {r.status_code}")
+            else:
+                feed = feedparser.parse(r.content)
+                etag = r.headers.get("ETag")
+                last_modified = r.headers.get("Last-Modified")
+                if cache is not None and (etag or last_modified):
+                    cache.put("feeds", feed_url, {
+                        "etag": etag,
+                        "last_modified": last_modified,
+                        "fetched_at": datetime.now().isoformat(),
+                        "entries": [entry_to_cache(e) for e in feed.entries],
+                    })
+                return feed.entries, False
+        except FeedFetchError:
+            raise
+        except Exception as e:
+            last_error = str(e)
+
+        if attempt < retries:
+            _backoff_sleep(attempt, backoff)
+
+    raise FeedFetchError(last_error or "unknown error")
+
+
+def iter_feeds(feed_urls: list[str],
+               max_workers: int = FEED_MAX_WORKERS,
+               cache=None,
+               **fetch_kwargs):
+    """
+    全フィードを並列取得し、届いた順に (feed_url, entries) を yield する
+    ※ 遅いフィードを待たずに後段（解決）を始められる。失敗したフィードは entries=[]
+    """
+    def _timed(url):
+        t0 = time.perf_counter()
+        try:
+            with METRICS.span("feed_fetch"):
+                entries, not_modified = fetch_feed(url, cache=cache, **fetch_kwargs)
+            err = None
+        except Exception as e:
+            entries, not_modified, err = [], False, e
+        return url, entries, not_modified, time.perf_counter() - t0, err
+
+    t_start = time.perf_counter()
+    latencies: list[float] = []
+    not_modified_count = 0
+
+    # 上限付きキュー: 後段が詰まっている間は取得側も待つ
+    for url, entries, not_modified, elapsed, err in bounded_imap_unordered(
+            _timed, feed_urls, workers=max_workers, maxsize=max_workers):
+        latencies.append(elapsed)
+        METRICS.incr("feeds_fetched", status="error" if err is not None
+                     else "not_modified" if not_modified else "ok")
+        if err is not None:
+            print(f"⚠️ RSS収集エラー: {url} - {err}（{elapsed*1000:.0f}ms）", flush=True)
+        else:
+            mark = " 304" if not_modified else ""
+            not_modified_count += int(not_modified)
+            print(f"  ⏱ {elapsed*1000:6.0f}ms  {len(entries):3d}件{mark}  {url}", flush=True)
+        yield url, entries
+
+    wall = time.perf_counter() - t_start
+    if latencies:
+        print(
+            f"  フィード取得: {len(feed_urls)}本 / 経過 {wall:.2f}s"
+            f"（逐次換算 {sum(latencies):.2f}s, 最大 {max(latencies):.2f}s, 304再利用 {not_modified_count}本）",
+            flush=True,
+        )
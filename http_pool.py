@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+共有HTTPクライアント層
+- requests.Session を1つだけ使い回し、ホストごとの keep-alive 接続をプール
+- ホスト単位の同時接続数上限 + 全体の同時リクエスト数上限
+- フィード取得・URL解決・（将来の）記事本文取得はすべてここを通す
+- プール統計（リクエスト数・ハンドシェイク数・再利用率）を取得可能
+- requests / urllib3 は HttpPool 生成時に import（起動・dry run では読み込まない）
+"""
+
+import threading
+from urllib.parse import urlparse
+
+HTTP_MAX_IN_FLIGHT = 32     # 全体の同時リクエスト数
+HTTP_PER_HOST_LIMIT = 8     # 同一ホストへの同時接続数（＝ホストごとのプールサイズ）
+HTTP_POOL_HOSTS = 256       # 保持するホスト別プール数（パブリッシャー数に合わせて多め）
+
+
+_counting_adapter_cls = None
+
+
+def _counting_adapter_class():
+    """_CountingAdapter クラス（requests / urllib3 を初回だけ import して定義）"""
+    global _counting_adapter_cls
+    if _counting_adapter_cls is not None:
+        return _counting_adapter_cls
+
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _CountingAdapter(HTTPAdapter):
+        """
+        実際の connect()（TCP + TLS ハンドシェイク）回数を数える HTTPAdapter
+        ※ urllib3 の num_connections は切断後の再接続を数えないため、接続クラス側で計数
+        """
+
+        def __init__(self, *args, **kwargs):
+            self.handshakes = 0
+            self._hs_lock = threading.Lock()
+            super().__init__(*args, **kwargs)
+
+        def _count_handshake(self):
+            with self._hs_lock:
+                self.handshakes += 1
+
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            adapter = self
+
+            class _HTTPConn(HTTPConnection):
+                def connect(self):
+                    super().connect()
+                    adapter._count_handshake()
+
+            class _HTTPSConn(HTTPSConnection):
+                def connect(self):
+                    super().connect()
+                    adapter._count_handshake()
+
+            class _HTTPPool(HTTPConnectionPool):
+                ConnectionCls = _HTTPConn
+
+            class _HTTPSPool(HTTPSConnectionPool):
+                ConnectionCls = _HTTPSConn
+
+            self.poolmanager.pool_classes_by_scheme = {"http": _HTTPPool, "https": _HTTPSPool}
+
+    _counting_adapter_cls = _CountingAdapter
+    return _counting_adapter_cls
+
+
+class HttpPool:
+    def __init__(self,
+                 max_in_flight: int = HTTP_MAX_IN_FLIGHT,
+                 per_host_limit: int = HTTP_PER_HOST_LIMIT,
+                 pool_hosts: int = HTTP_POOL_HOSTS):
+        import requests
+
+        self.per_host_limit = per_host_limit
+        self.session = requests.Session()
+        adapter = _counting_adapter_class()(
+            pool_connections=pool_hosts,
+            pool_maxsize=per_host_limit,
+            pool_block=False,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._adapter = adapter
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._host_sems: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+
+    def _host_semaphore(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            sem = self._host_sems.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_sems[host] = sem
+            return sem
+
+    def request(self, method: str, url: str, **kwargs) -> "requests.Response":
+        with self._host_semaphore(url), self._in_flight:
+            with self._lock:
+                self._requests += 1
+            try:
+                return self.session.request(method, url, **kwargs)
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                raise
+
+    def get(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> "requests.Response":
+        return self.request("HEAD", url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        urllib3 のホスト別プールから集計（リダイレクト先への要求も含む）
+        handshakes = TCP(+TLS)接続の確立回数、reuse_rate = 1 - handshakes / http_requests
+        """
+        http_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            http_requests += getattr(pool, "num_requests", 0)
+        connections = self._adapter.handshakes
+        with self._lock:
+            calls, errors = self._requests, self._errors
+        reuse = 1 - connections / http_requests if http_requests else 0.0
+        return {
+            "calls": calls,
+            "errors": errors,
+            "http_requests": http_requests,
+            "handshakes": connections,
+            "reuse_rate": round(max(reuse, 0.0), 3),
+            "hosts": len(pools),
+        }
+
+    def summary(self) -> str:
+        st = self.stats()
+        return (f"HTTPプール: 呼出 {st['calls']} / 要求 {st['http_requests']}"
+                f" / ハンドシェイク {st['handshakes']} / 再利用率 {st['reuse_rate']:.0%}"
+                f" / ホスト {st['hosts']} / エラー {st['errors']}")
+
+
+_shared_pool: HttpPool | None = None
+_shared_lock = threading.Lock()
+
+
+def get_pool() -> HttpPool:
+    """プロセス共有の HttpPool（初回呼び出し時に生成）"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = HttpPool()
+        return _shared_pool
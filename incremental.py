@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+差分実行（フィードごとの high-water mark）
+- フィードごとに「最新の公開日時（hwm_ts）」と「既読 guid → 公開日時」を feeds セクションに保存
+  キー: "hwm:<フィードURL>"（ETag 等の条件付きGET用レコードとは別キー）
+- 既読 guid・保持期間より古い entry はリダイレクト解決・重複除外に回さない
+- 既読に登録するのは、記事として解決できた entry と、重複除外・掲載元フィルタで意図的に落とした entry だけ
+  （解決失敗は未読のまま → 次回また解決を試みる。URL解決キャッシュの失敗TTLが過ぎれば再取得）
+- 解決済みの記事は news セクションの記事レコード（signature キー）の item に保存し、
+  次回以降は新着分とまとめて候補選定に使う（要約ストアの summary と同じレコード）
+- 保持期間は news_retention_days（monthly 枠より古い記事は候補にならないので読み込まない）
+"""
+
+import time
+import threading
+
+from news_cache import NewsCache, retention_sec
+from feed_fetcher import parse_feed_date
+
+FEED_STATE_SECTION = "feeds"
+FEED_STATE_PREFIX = "hwm:"
+ITEM_SECTION = "news"
+FEED_SEEN_MAX = 1000           # 1フィードあたりの既読 guid 上限（新しい順に残す）
+
+# 保存する記事フィールド（process_rss_entry の戻り値 + 出現フィード）
+ITEM_FIELDS = ("title_zh", "snippet", "publisher", "published", "published_ts",
+               "link", "signature", "feeds")
+
+
+def entry_guid(entry) -> str | None:
+    return entry.get("id") or entry.get("guid") or entry.get("link") or None
+
+
+def entry_timestamp(entry) -> float | None:
+    d = parse_feed_date(entry.get("published"))
+    try:
+        return d.timestamp() if d else None
+    except (OverflowError, ValueError, OSError):
+        return None
+
+
+class FeedWatermarks:
+    """
+    フィードごとの既読管理
+
+    値の形式: {"hwm_ts": epoch秒, "seen": {guid: epoch秒}, "updated_at": epoch秒}
+
+    使い方:
+        new_entries = marks.filter_new(feed_url, entries)   # 既読を除外
+        ... 解決 ...
+        marks.mark_seen(feed_url, entry)                      # 解決できた / 意図的に落とした entry だけ
+        ... 保存 ...
+        marks.commit()                                        # 既読を確定（cache.save() でコミット）
+    """
+
+    def __init__(self, cache: NewsCache, window_sec: int | None = None, now: float | None = None):
+        self.cache = cache
+        self.window_sec = window_sec if window_sec is not None else retention_sec("news_retention_days", 30)
+        self.now = now if now is not None else time.time()
+        self.new = 0
+        self.seen_skipped = 0
+        self.stale_skipped = 0
+        self.marked = 0
+        self._pending: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, feed_url: str) -> dict:
+        rec = self.cache.get(FEED_STATE_SECTION, FEED_STATE_PREFIX + feed_url)
+        if not isinstance(rec, dict) or not isinstance(rec.get("seen"), dict):
+            return {"hwm_ts": 0.0, "seen": {}}
+        return rec
+
+    def _state(self, feed_url: str) -> dict:
+        state = self._pending.get(feed_url)
+        if state is None:
+            state = self._pending[feed_url] = self._load(feed_url)
+        return state
+
+    def filter_new(self, feed_url: str, entries: list) -> list:
+        floor = self.now - self.window_sec
+        out = []
+        with self._lock:
+            state = self._state(feed_url)
+            seen: dict = state["seen"]
+            hwm = float(state.get("hwm_ts") or 0.0)
+            for ent in entries:
+                guid = entry_guid(ent)
+                ts = entry_timestamp(ent)
+                if ts is not None and ts < floor:
+                    # monthly 枠より古い = 候補にならない
+                    self.stale_skipped += 1
+                    continue
+                # hwm より新しければ新着確定。それ以外は既読 guid と照合
+                # （hwm 以下でも未読 guid = 前回解決に失敗した entry は通す）
+                fresh = ts is not None and ts > hwm
+                if not fresh and guid and guid in seen:
+                    self.seen_skipped += 1
+                    continue
+                out.append(ent)
+                if ts is not None and ts > hwm:
+                    hwm = ts
+            state["hwm_ts"] = hwm
+            self.new += len(out)
+        return out
+
+    def mark_seen(self, feed_url: str, entry):
+        """解決できた / 意図的に落とした entry を既読予定に登録（commit で確定）"""
+        guid = entry_guid(entry)
+        if not guid:
+            return
+        ts = entry_timestamp(entry)
+        with self._lock:
+            self._state(feed_url)["seen"][guid] = ts if ts is not None else self.now
+            self.marked += 1
+
+    def commit(self):
+        floor = self.now - self.window_sec
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+        for feed_url, state in pending:
+            seen = {g: ts for g, ts in state["seen"].items() if ts >= floor}
+            if len(seen) > FEED_SEEN_MAX:
+                seen = dict(sorted(seen.items(), key=lambda kv: kv[1], reverse=True)[:FEED_SEEN_MAX])
+            self.cache.put(FEED_STATE_SECTION, FEED_STATE_PREFIX + feed_url, {
+                "hwm_ts": state["hwm_ts"],
+                "seen": seen,
+                "updated_at": self.now,
+            })
+
+    def summary(self) -> str:
+        return (f"差分取り込み: 新着 {self.new}（既読登録 {self.marked}）/ 既読スキップ {self.seen_skipped}"
+                f" / 期間外スキップ {self.stale_skipped}")
+
+
+class RetainedNewsStore:
+    """
+    解決済み記事の保持（news セクションの記事レコードに item として保存）
+
+    値の形式: {"item": {...}, "stored_at": epoch秒, "summary": ...（ArticleSummaryStore）}
+    """
+
+    def __init__(self, cache: NewsCache, window_sec: int | None = None, now: float | None = None):
+        self.cache = cache
+        self.window_sec = window_sec if window_sec is not None else retention_sec("news_retention_days", 30)
+        self.now = now if now is not None else time.time()
+        self.stored = 0
+        self.loaded = 0
+        self._lock = threading.Lock()
+
+    def _in_window(self, rec: dict) -> bool:
+        item = rec.get("item")
+        if not isinstance(item, dict):
+            return False
+        ts = item.get("published_ts") or rec.get("stored_at") or 0
+        return float(ts) >= self.now - self.window_sec
+
+    def put(self, item: dict):
+        sig = item.get("signature")
+        if not sig:
+            return
+        rec = self.cache.get(ITEM_SECTION, sig)
+        rec = dict(rec) if isinstance(rec, dict) else {}
+        new_item = {k: item.get(k) for k in ITEM_FIELDS}
+        # 前回と同じ記事が別フィードに現れた場合は出現フィードを和集合に
+        prev_feeds = (rec.get("item") or {}).get("feeds") or []
+        new_item["feeds"] = list(dict.fromkeys(prev_feeds + list(item.get("feeds") or [])))
+        item["feeds"] = list(new_item["feeds"])
+        rec["item"] = new_item
+        rec.setdefault("stored_at", self.now)
+        self.cache.put(ITEM_SECTION, sig, rec)
+        with self._lock:
+            self.stored += 1
+
+    def load(self, exclude: set[str] | None = None) -> list[dict]:
+        """保持期間内の記事（exclude の signature は除く）"""
+        out = []
+        for sig, rec in self.cache.items(ITEM_SECTION):
+            if exclude and sig in exclude:
+                continue
+            if isinstance(rec, dict) and self._in_window(rec):
+                out.append(dict(rec["item"]))
+        self.loaded = len(out)
+        return out
+
+    def prune(self) -> int:
+        """期間外の item を外す（要約が残っていればレコードは残す）"""
+        removed = 0
+        for sig, rec in self.cache.items(ITEM_SECTION):
+            if not isinstance(rec, dict) or "item" not in rec or self._in_window(rec):
+                continue
+            rest = {k: v for k, v in rec.items() if k not in ("item", "stored_at")}
+            if rest:
+                self.cache.put(ITEM_SECTION, sig, rest)
+            else:
+                self.cache.delete(ITEM_SECTION, sig)
+            removed += 1
+        return removed
+
+    def summary(self) -> str:
+        return f"保持記事: 読み込み {self.loaded} / 新規保存 {self.stored}"
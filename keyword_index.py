@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+銘柄キーワード転置インデックス
+- 全銘柄のキーワード（別名）・除外語を Aho-Corasick オートマトンに1回だけコンパイル
+- 収集済みニュース（タイトル + 概要）を1パス走査し、各ニュースが言及する銘柄をすべて求める
+- 銘柄ごとの候補取得は O(ヒット数)（ニュース数 × キーワード数 の総当たりを置き換え）
+"""
+
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    複数パターンの同時部分一致（大文字小文字は区別 = 従来の `kw in text` と同じ）
+
+    patterns: {パターン文字列: 任意のペイロード集合}
+    find(text) は text に出現した全パターンのペイロードの和集合を返す
+    """
+
+    def __init__(self, patterns: dict[str, set]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[frozenset] = [frozenset()]
+        outs: list[set] = [set()]
+
+        for pat, payloads in patterns.items():
+            if not pat:
+                continue
+            node = 0
+            for ch in pat:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outs.append(set())
+                node = nxt
+            outs[node] |= set(payloads)
+
+        # BFS で failure リンクを張り、出力を failure 先から継承
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                outs[nxt] |= outs[self._fail[nxt]]
+
+        self._out = [frozenset(o) for o in outs]
+
+    def find(self, text: str) -> set:
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+        return found
+
+
+class StockMatcher:
+    """
+    全銘柄の別名テーブルをコンパイルした照合器（起動時に1回だけ作る）
+
+    Args:
+        keywords_by_stock: {stock_id: [キーワード/別名, ...]}
+        business_by_stock: {stock_id: 業種ワード}（候補不足時の補助ヒット用、空なら無し）
+        excludes_by_stock: {stock_id: [除外語, ...]}（含むニュースはその銘柄の候補にしない）
+    """
+
+    KEYWORD = "kw"
+    BUSINESS = "bt"
+    EXCLUDE = "ex"
+
+    def __init__(self, keywords_by_stock: dict[str, list[str]],
+                 business_by_stock: dict[str, str] | None = None,
+                 excludes_by_stock: dict[str, list[str]] | None = None):
+        patterns: dict[str, set] = {}
+        for sid, kws in keywords_by_stock.items():
+            for kw in kws:
+                if kw:
+                    patterns.setdefault(kw, set()).add((sid, self.KEYWORD))
+        for sid, bt in (business_by_stock or {}).items():
+            if bt:
+                patterns.setdefault(bt, set()).add((sid, self.BUSINESS))
+        for sid, exs in (excludes_by_stock or {}).items():
+            for ex in exs:
+                if ex:
+                    patterns.setdefault(ex, set()).add((sid, self.EXCLUDE))
+        self.automaton = AhoCorasick(patterns)
+        self.pattern_count = len(patterns)
+
+    def match(self, text: str) -> set[tuple[str, str]]:
+        """text に該当する (stock_id, 種別) の集合（除外語を含む銘柄は取り除く）"""
+        found = self.automaton.find(text)
+        excluded = {sid for sid, kind in found if kind == self.EXCLUDE}
+        return {(sid, kind) for sid, kind in found
+                if kind != self.EXCLUDE and sid not in excluded}
+
+    def index(self, all_news: list[dict]) -> "StockKeywordIndex":
+        return StockKeywordIndex(self, all_news)
+
+
+class StockKeywordIndex:
+    """
+    ニュース → 言及銘柄 の一括インデックス（StockMatcher.index(all_news) で作る）
+    """
+
+    def __init__(self, matcher: StockMatcher, all_news: list[dict]):
+        self._hits: dict[tuple[str, str], list[int]] = {}
+        self.news = all_news
+        for i, n in enumerate(all_news):
+            text = f"{n.get('title_zh','')} {n.get('snippet','')}"
+            for key in matcher.match(text):
+                self._hits.setdefault(key, []).append(i)
+
+    def keyword_hits(self, stock_id: str) -> list[dict]:
+        return [self.news[i] for i in self._hits.get((stock_id, StockMatcher.KEYWORD), [])]
+
+    def business_hits(self, stock_id: str, exclude: list[dict] | None = None) -> list[dict]:
+        skip = {id(n) for n in (exclude or [])}
+        return [self.news[i] for i in self._hits.get((stock_id, StockMatcher.BUSINESS), [])
+                if id(self.news[i]) not in skip]
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+LLM応答キャッシュ（Gemini / OpenAI 共通）
+- キー: モデル名 + 正規化したプロンプトの SHA-256（内容アドレス方式）
+- v5 キャッシュファイルの llm_responses セクションに保存
+- 有効期限は system_config.json の cache_policy.topic_retention_days
+- 件数上限を超えたら最終利用が古い順に削除（LRU）
+- 環境変数 LLM_CACHE_BYPASS=1 で読み出しを無効化（書き込みは行うので結果は更新される）
+- ヒット / ミス / 節約バイト数を集計
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+
+from news_cache import NewsCache, retention_sec
+
+LLM_CACHE_SECTION = "llm_responses"
+LLM_CACHE_MAX_ENTRIES = 2000
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS", "0").strip() == "1"
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt or "").strip()
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    base = f"{model}\n{normalize_prompt(prompt)}"
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    値の形式: {"model": str, "text": 応答本文, "created_at": epoch秒, "last_used": epoch秒, "bytes": int}
+    """
+
+    def __init__(self, cache: NewsCache,
+                 ttl_sec: int | None = None,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 bypass: bool = LLM_CACHE_BYPASS):
+        self.cache = cache
+        self.ttl_sec = ttl_sec if ttl_sec is not None else retention_sec("topic_retention_days", 10)
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def get(self, model: str, prompt: str) -> str | None:
+        if self.bypass:
+            with self._lock:
+                self.misses += 1
+            return None
+        key = prompt_key(model, prompt)
+        rec = self.cache.get(LLM_CACHE_SECTION, key)
+        now = time.time()
+        if isinstance(rec, dict) and now - float(rec.get("created_at", 0)) <= self.ttl_sec:
+            rec = dict(rec, last_used=now)
+            self.cache.put(LLM_CACHE_SECTION, key, rec)
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += int(rec.get("bytes", 0))
+            return rec.get("text")
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model: str, prompt: str, text: str):
+        if not text:
+            return
+        now = time.time()
+        self.cache.put(LLM_CACHE_SECTION, prompt_key(model, prompt), {
+            "model": model,
+            "text": text,
+            "created_at": now,
+            "last_used": now,
+            # 節約量 = 送らずに済むプロンプト + 受け取らずに済む応答
+            "bytes": len(prompt.encode("utf-8")) + len(text.encode("utf-8")),
+        })
+
+    def prune(self) -> int:
+        """期限切れを削除し、上限超過分を最終利用の古い順に削除する"""
+        now = time.time()
+        removed = 0
+        alive = []
+        for key, rec in self.cache.items(LLM_CACHE_SECTION):
+            if not isinstance(rec, dict) or now - float(rec.get("created_at", 0)) > self.ttl_sec:
+                self.cache.delete(LLM_CACHE_SECTION, key)
+                removed += 1
+            else:
+                alive.append((float(rec.get("last_used", 0)), key))
+        overflow = len(alive) - self.max_entries
+        if overflow > 0:
+            alive.sort()
+            for _, key in alive[:overflow]:
+                self.cache.delete(LLM_CACHE_SECTION, key)
+                removed += 1
+        return removed
+
+    def summary(self) -> str:
+        mode = "（バイパス中）" if self.bypass else ""
+        return (f"LLMキャッシュ{mode}: ヒット {self.hits} / ミス {self.misses}"
+                f" / 節約 {self.bytes_saved / 1024:.1f}KB")
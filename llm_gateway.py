@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+LLM呼び出しの共通窓口（Gemini / OpenAI）
+- クライアントはプロバイダごとに1つだけ作り、全スレッドで使い回す（SDK 内部の接続プールを共有）
+  SDK の import・クライアント生成は初回呼び出し時
+- プロバイダごとの同時実行数上限 + レート制御（rate_limit の RPM/TPM トークンバケット）
+- 429/5xx はジッター付きバックオフで再試行（rate_limit.call_with_retry）
+- サーキットブレーカー: 直近の失敗率が高ければ一定時間呼び出しを止め、
+  LLMUnavailable を送出 → 呼び出し側は既存のフォールバック（強制採用・単純クラスタ等）に切り替える
+- 1回ごとにレイテンシ・トークン数（SDK の usage、無ければ見積もり）を返し、集計も保持
+- async 版（agenerate）は asyncio.to_thread で同期版を実行
+- 応答からの JSON 抽出（extract_json）も共通化
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+
+from rate_limit import (LLMRateLimiter, call_with_retry, estimate_tokens,
+                        GEMINI_RPM, GEMINI_TPM, OPENAI_RPM, OPENAI_TPM)
+from metrics import METRICS
+
+LLM_TIMEOUT_SEC = float(os.getenv("LLM_TIMEOUT_SEC", "60"))
+
+# プロバイダごとの同時実行数
+LLM_MAX_CONCURRENCY = {
+    "gemini": max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))),
+    "openai": max(1, int(os.getenv("OPENAI_MAX_CONCURRENCY", "4"))),
+}
+LLM_RATE_LIMITS = {
+    "gemini": (GEMINI_RPM, GEMINI_TPM),
+    "openai": (OPENAI_RPM, OPENAI_TPM),
+}
+
+# サーキットブレーカー
+BREAKER_WINDOW = 20          # 直近この回数の成否で判定
+BREAKER_MIN_CALLS = 5        # 判定に必要な最小回数
+BREAKER_ERROR_RATIO = 0.5    # 失敗率がこれ以上で遮断
+BREAKER_COOLDOWN_SEC = 120   # 遮断後、試験的に1回通すまでの秒数
+
+
+class LLMUnavailable(Exception):
+    """クライアントが無い（APIキー未設定等）/ サーキットブレーカーが遮断中"""
+
+
+def extract_json(text: str | None) -> dict | None:
+    # JSONだけ取り出す（前後の説明文・```json フェンスは無視）
+    m = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not m:
+        return None
+    try:
+        data = json.loads(m.group())
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class CircuitBreaker:
+    """closed（通常）→ open（遮断）→ cooldown 後 half-open（1回だけ試す）→ 成功で closed"""
+
+    def __init__(self, name: str,
+                 window: int = BREAKER_WINDOW,
+                 min_calls: int = BREAKER_MIN_CALLS,
+                 error_ratio: float = BREAKER_ERROR_RATIO,
+                 cooldown_sec: float = BREAKER_COOLDOWN_SEC):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_ratio = error_ratio
+        self.cooldown_sec = cooldown_sec
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._probing else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.cooldown_sec:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                    print(f"  🔌 {self.name}: 回復（遮断解除）", flush=True)
+                else:
+                    self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(ok)
+            n = len(self._outcomes)
+            errors = n - sum(self._outcomes)
+            if self._opened_at is None and n >= self.min_calls and errors / n >= self.error_ratio:
+                self._opened_at = time.monotonic()
+                print(f"  🔌 {self.name}: 失敗率 {errors}/{n} のため {self.cooldown_sec:.0f}秒 遮断"
+                      f"（フォールバックに切り替え）", flush=True)
+
+
+def _gemini_client(timeout_sec: float):
+    api_key = os.getenv("GEMINI_API_KEY", "").strip()
+    if not api_key:
+        return None
+    # Gemini SDK (Google GenAI SDK)
+    # pip install google-genai
+    from google import genai  # type: ignore
+    from google.genai import types  # type: ignore
+    return genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=int(timeout_sec * 1000)))
+
+
+def _openai_client(timeout_sec: float):
+    if not os.getenv("OPENAI_API_KEY", "").strip():
+        return None
+    from openai import OpenAI
+    # 再試行はゲートウェイ側（call_with_retry）で行う
+    return OpenAI(timeout=timeout_sec, max_retries=0)
+
+
+def _gemini_call(client, model: str, prompt: str, system: str | None, temperature: float | None):
+    config = {}
+    if system:
+        config["system_instruction"] = system
+    if temperature is not None:
+        config["temperature"] = temperature
+    resp = client.models.generate_content(model=model, contents=prompt, config=config or None)
+    usage = getattr(resp, "usage_metadata", None)
+    return ((resp.text or "").strip(),
+            getattr(usage, "prompt_token_count", None),
+            getattr(usage, "candidates_token_count", None))
+
+
+def _openai_call(client, model: str, prompt: str, system: str | None, temperature: float | None):
+    messages = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+    kwargs = {"temperature": temperature} if temperature is not None else {}
+    resp = client.chat.completions.create(model=model, messages=messages, **kwargs)
+    usage = getattr(resp, "usage", None)
+    return ((resp.choices[0].message.content or "").strip(),
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None))
+
+
+_PROVIDERS = {
+    "gemini": (_gemini_client, _gemini_call),
+    "openai": (_openai_client, _openai_call),
+}
+
+
+class _Provider:
+    def __init__(self, name: str, timeout_sec: float):
+        self.name = name
+        self.timeout_sec = timeout_sec
+        self.make_client, self.call = _PROVIDERS[name]
+        self.limiter = LLMRateLimiter(*LLM_RATE_LIMITS[name])
+        self.slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY[name])
+        self.breaker = CircuitBreaker(name)
+        self.stats = {"calls": 0, "errors": 0, "rejected": 0, "latency_sum": 0.0, "latency_max": 0.0,
+                      "prompt_tokens": 0, "output_tokens": 0}
+        self._client = None
+        self._client_failed = False
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None and not self._client_failed:
+                try:
+                    self._client = self.make_client(self.timeout_sec)
+                except Exception as e:
+                    print(f"⚠️ {self.name} クライアント生成失敗: {e}", flush=True)
+                self._client_failed = self._client is None
+            return self._client
+
+
+class LLMGateway:
+    """
+    使い方:
+        gw = get_gateway()
+        res = gw.generate("gemini", prompt, model=GEMINI_MODEL)
+        res["text"], res["latency_sec"], res["prompt_tokens"], res["output_tokens"]
+    """
+
+    def __init__(self, timeout_sec: float = LLM_TIMEOUT_SEC):
+        self._providers = {name: _Provider(name, timeout_sec) for name in _PROVIDERS}
+
+    def available(self, provider: str) -> bool:
+        p = self._providers[provider]
+        return p.client() is not None and p.breaker.state != "open"
+
+    def generate(self, provider: str, prompt: str, model: str,
+                 system: str | None = None,
+                 temperature: float | None = None) -> dict:
+        """
+        Returns:
+            {"text", "provider", "model", "latency_sec", "attempts",
+             "prompt_tokens", "output_tokens", "tokens_estimated"}
+
+        Raises:
+            LLMUnavailable: クライアントが無い / 遮断中
+            その他: 再試行しても失敗した SDK の例外
+        """
+        p = self._providers[provider]
+        client = p.client()
+        if client is None:
+            raise LLMUnavailable(f"{provider}: クライアントなし（APIキー未設定）")
+        if not p.breaker.allow():
+            with p._lock:
+                p.stats["rejected"] += 1
+            METRICS.incr("llm_rejected", provider=provider)
+            raise LLMUnavailable(f"{provider}: サーキットブレーカー遮断中")
+
+        est = estimate_tokens((system or "") + prompt)
+        attempts = 0
+
+        def before_call():
+            nonlocal attempts
+            attempts += 1
+            p.limiter.acquire(est)
+
+        def call_once():
+            with p.slots:
+                return p.call(client, model, prompt, system, temperature)
+
+        METRICS.incr("llm_calls", provider=provider)
+        t0 = time.perf_counter()
+        try:
+            with METRICS.span(f"{provider}_call"):
+                text, in_tok, out_tok = call_with_retry(call_once, before_call=before_call)
+        except Exception:
+            p.breaker.record(False)
+            with p._lock:
+                p.stats["calls"] += 1
+                p.stats["errors"] += 1
+            METRICS.incr("llm_errors", provider=provider)
+            raise
+        latency = time.perf_counter() - t0
+        p.breaker.record(True)
+
+        estimated = in_tok is None or out_tok is None
+        in_tok = in_tok if in_tok is not None else est
+        out_tok = out_tok if out_tok is not None else estimate_tokens(text)
+        with p._lock:
+            st = p.stats
+            st["calls"] += 1
+            st["latency_sum"] += latency
+            st["latency_max"] = max(st["latency_max"], latency)
+            st["prompt_tokens"] += in_tok
+            st["output_tokens"] += out_tok
+        METRICS.incr("llm_prompt_tokens", in_tok, provider=provider)
+        METRICS.incr("llm_output_tokens", out_tok, provider=provider)
+        return {
+            "text": text,
+            "provider": provider,
+            "model": model,
+            "latency_sec": latency,
+            "attempts": attempts,
+            "prompt_tokens": in_tok,
+            "output_tokens": out_tok,
+            "tokens_estimated": estimated,
+        }
+
+    async def agenerate(self, provider: str, prompt: str, model: str,
+                        system: str | None = None,
+                        temperature: float | None = None) -> dict:
+        """generate の async 版（イベントループを塞がないよう別スレッドで実行）"""
+        return await asyncio.to_thread(self.generate, provider, prompt, model, system, temperature)
+
+    def stats(self, provider: str) -> dict:
+        p = self._providers[provider]
+        with p._lock:
+            st = dict(p.stats)
+        ok = st["calls"] - st["errors"]
+        st["latency_avg"] = st["latency_sum"] / ok if ok else 0.0
+        st["breaker"] = p.breaker.state
+        return st
+
+    def summary(self) -> str:
+        parts = []
+        for name in self._providers:
+            st = self.stats(name)
+            if not (st["calls"] or st["rejected"]):
+                continue
+            parts.append(f"{name} 呼出 {st['calls']}（失敗 {st['errors']} / 遮断 {st['rejected']}）"
+                         f" 平均 {st['latency_avg']:.1f}s 最大 {st['latency_max']:.1f}s"
+                         f" トークン 入力 {st['prompt_tokens']} / 出力 {st['output_tokens']}"
+                         f" [{st['breaker']}]")
+        return "LLMゲートウェイ: " + (" / ".join(parts) if parts else "呼び出しなし")
+
+
+_shared_gateway: LLMGateway | None = None
+_shared_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """プロセス共有の LLMGateway（初回呼び出し時に生成）"""
+    global _shared_gateway
+    with _shared_lock:
+        if _shared_gateway is None:
+            _shared_gateway = LLMGateway()
+        return _shared_gateway
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+論点クラスタのローカル計算（LLM を使わない）
+- 見出し + 概要の文字 n-gram TF-IDF（relevance_ranker と同じベクトル化）
+- コサイン類似度の群平均法（average linkage）で凝集。
+  最も近いクラスタ対の平均類似度が CLUSTER_SIM_THRESHOLD 未満になったら停止
+  1銘柄の関連ニュースは多くても数十件なので、密行列のまま全対比較で十分速い
+- 代表ニュース = クラスタ重心とのコサイン類似度 + 関連性スコア（最大値で正規化）× 重み が最大のもの
+- テーマ名は代表ニュースの見出し、補足の視点は delayed_valuable_news の類型から付ける
+  （LLM でのテーマ命名は news_clustering_v51.name_cluster_themes で任意に上書き）
+- 出力は cluster_news_by_topic と同じ形式。NumPy が無い環境では None
+"""
+
+from near_dedup import strip_publisher_suffix
+from prompt_compact import compact_snippet
+from relevance_ranker import char_ngrams, tfidf_matrix
+from delayed_valuable_news import VALUABLE_KEYWORD_CLASSES
+
+CLUSTER_SIM_THRESHOLD = 0.08    # これ以上似ていれば同じ論点
+REP_W_CENTROID = 1.0            # 代表選定: 重心との類似度
+REP_W_RELEVANCE = 1.0           # 代表選定: 関連性スコア（0〜1 に正規化）
+THEME_MAX_CHARS = 40
+
+PERSPECTIVE_LABELS = {
+    "earnings": "業績視点",
+    "tech_supply": "技術・需給視点",
+    "policy": "政策視点",
+}
+
+
+def _relevance(news: dict) -> float:
+    try:
+        return float(news.get("relevance_score") or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def news_text(news: dict) -> str:
+    title = strip_publisher_suffix(news.get("title", ""), news.get("publisher"))
+    snippet = compact_snippet(news.get("snippet", ""), news.get("title", ""), news.get("publisher", ""))
+    return f"{title} {snippet}"
+
+
+def perspective_of(news: dict) -> str:
+    text = f"{news.get('title', '')} {news.get('snippet', '')}"
+    for cls, keywords in VALUABLE_KEYWORD_CLASSES.items():
+        if any(kw in text for kw in keywords):
+            return PERSPECTIVE_LABELS[cls]
+    return "追加情報"
+
+
+def _theme_of(news: dict) -> str:
+    title = strip_publisher_suffix(news.get("title", ""), news.get("publisher")).strip()
+    return title if len(title) <= THEME_MAX_CHARS else title[:THEME_MAX_CHARS] + "…"
+
+
+def agglomerate(sim, np, threshold: float = CLUSTER_SIM_THRESHOLD) -> list[list[int]]:
+    """
+    群平均法（クラスタ間類似度は Lance-Williams の式で更新するので1回の併合は O(n)）
+
+    Returns:
+        [[index, ...], ...]（各クラスタ内・クラスタ間とも先頭 index 順）
+    """
+    n = sim.shape[0]
+    s = sim.astype(np.float64)
+    np.fill_diagonal(s, -np.inf)
+    groups: list[list[int] | None] = [[i] for i in range(n)]
+    for _ in range(n - 1):
+        a, b = divmod(int(np.argmax(s)), n)
+        if s[a, b] < threshold:
+            break
+        a, b = min(a, b), max(a, b)
+        na, nb = len(groups[a]), len(groups[b])
+        merged = (na * s[a] + nb * s[b]) / (na + nb)
+        s[a, :] = merged
+        s[:, a] = merged
+        s[b, :] = -np.inf
+        s[:, b] = -np.inf
+        s[a, a] = -np.inf
+        groups[a] = sorted(groups[a] + groups[b])
+        groups[b] = None
+    return [g for g in groups if g is not None]
+
+
+def cluster_news_locally(relevant_news: list[dict],
+                         threshold: float = CLUSTER_SIM_THRESHOLD) -> dict | None:
+    """
+    Returns:
+        cluster_news_by_topic と同じ形式の dict（クラスタは代表の関連性スコア → 件数の多い順）
+        NumPy が無ければ None
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    if not relevant_news:
+        return {"clusters": [], "is_single_event": False, "event_description": None}
+
+    m = tfidf_matrix([char_ngrams(news_text(n)) for n in relevant_news], np)
+    sim = m @ m.T
+    rel = np.array([_relevance(n) for n in relevant_news])
+    rel_norm = rel / rel.max() if rel.max() > 0 else rel
+
+    clusters = []
+    for members in agglomerate(sim, np, threshold):
+        centroid = m[members].mean(axis=0)
+        norm = np.linalg.norm(centroid)
+        closeness = m[members] @ (centroid / norm if norm > 0 else centroid)
+        score = REP_W_CENTROID * closeness + REP_W_RELEVANCE * rel_norm[members]
+        order = [members[k] for k in np.argsort(-score, kind="stable")]
+        rep = order[0]
+        clusters.append(((float(rel[rep]), len(members)), {
+            "theme": _theme_of(relevant_news[rep]),
+            "representative": relevant_news[rep],
+            "representative_reason": (f"クラスタ重心との類似度 {float(closeness[members.index(rep)]):.2f}"
+                                      f"・関連性スコア {relevant_news[rep].get('relevance_score')}"
+                                      f"（{len(members)}件中）"),
+            "supplementary": [relevant_news[i] for i in order[1:]],
+            "supplementary_perspectives": [perspective_of(relevant_news[i]) for i in order[1:]],
+        }))
+
+    clusters.sort(key=lambda c: c[0], reverse=True)
+    out = [{"cluster_id": i, **c} for i, (_, c) in enumerate(clusters, 1)]
+    single = len(out) == 1 and len(relevant_news) >= 3
+    return {
+        "clusters": out,
+        "is_single_event": single,
+        "event_description": out[0]["theme"] if single else None,
+    }
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+段階別の計測（span = 所要時間 / counter = 件数）
+- 環境変数 NEWS_METRICS_DIR を設定したときだけ有効
+  無効時の span() は共有の何もしないコンテキストを返すだけ（計測コストほぼゼロ）
+- 実行終了時に write_reports() で2種類を出力
+    news_metrics.json : 人が読む・差分を取る用のサマリー
+    news_metrics.prom : Prometheus textfile collector 用（node_exporter 等が読む）
+- スレッドセーフ（銘柄並列・URL解決ワーカーから同時に記録してよい）
+
+使い方:
+    from metrics import METRICS
+    with METRICS.span("feed_fetch"):
+        ...
+    METRICS.incr("feed_not_modified")
+"""
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+
+METRICS_DIR = os.getenv("NEWS_METRICS_DIR", "").strip()
+METRICS_PREFIX = "taiwan_news"
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("_metrics", "_key", "_t0")
+
+    def __init__(self, metrics: "Metrics", key: tuple):
+        self._metrics = metrics
+        self._key = key
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._metrics._record(self._key, time.perf_counter() - self._t0, failed=exc_type is not None)
+        return False
+
+
+def _prom_escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def _prom_value(v) -> str:
+    # 整数はそのまま、小数は repr（:g の有効6桁で 1234567 → 1.23457e+06 にならないように）
+    if isinstance(v, int) or float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class Metrics:
+    """
+    span: {count, errors, sum, max}（秒）/ counter: 合計値
+    同じ名前でもラベル（例: bucket="today"）が違えば別系列
+    """
+
+    def __init__(self, enabled: bool = bool(METRICS_DIR), out_dir: str = METRICS_DIR):
+        self.enabled = enabled
+        self.out_dir = out_dir
+        self._spans: dict[tuple, dict] = {}
+        self._counters: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def span(self, name: str, **labels):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, _labels_key(name, labels))
+
+    def incr(self, name: str, n: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _labels_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def _record(self, key: tuple, elapsed: float, failed: bool = False):
+        with self._lock:
+            s = self._spans.get(key)
+            if s is None:
+                s = self._spans[key] = {"count": 0, "errors": 0, "sum": 0.0, "max": 0.0}
+            s["count"] += 1
+            s["errors"] += int(failed)
+            s["sum"] += elapsed
+            if elapsed > s["max"]:
+                s["max"] = elapsed
+
+    # ---------- 出力 ----------
+    def snapshot(self) -> dict:
+        with self._lock:
+            spans = [{"name": k[0], "labels": dict(k[1]), **v} for k, v in sorted(self._spans.items())]
+            counters = [{"name": k[0], "labels": dict(k[1]), "value": v}
+                        for k, v in sorted(self._counters.items())]
+        return {
+            "started_at": datetime.fromtimestamp(self._started).isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "spans": spans,
+            "counters": counters,
+        }
+
+    @staticmethod
+    def _prom_labels(labels: dict) -> str:
+        if not labels:
+            return ""
+        body = ",".join(f'{k}="{_prom_escape(v)}"' for k, v in labels.items())
+        return "{" + body + "}"
+
+    def prometheus_text(self, snap: dict | None = None) -> str:
+        snap = snap or self.snapshot()
+        p = METRICS_PREFIX
+        lines = [
+            f"# HELP {p}_stage_seconds 段階ごとの所要時間（秒）",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        for s in snap["spans"]:
+            lab = {"stage": s["name"], **s["labels"]}
+            lines.append(f"{p}_stage_seconds_sum{self._prom_labels(lab)} {s['sum']:.6f}")
+            lines.append(f"{p}_stage_seconds_count{self._prom_labels(lab)} {s['count']}")
+        lines += [f"# TYPE {p}_stage_seconds_max gauge"]
+        lines += [f"{p}_stage_seconds_max{self._prom_labels({'stage': s['name'], **s['labels']})} {s['max']:.6f}"
+                  for s in snap["spans"]]
+        lines += [f"# TYPE {p}_stage_errors_total counter"]
+        lines += [f"{p}_stage_errors_total{self._prom_labels({'stage': s['name'], **s['labels']})} {s['errors']}"
+                  for s in snap["spans"]]
+        for name in sorted({c["name"] for c in snap["counters"]}):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines += [f"{p}_{name}_total{self._prom_labels(c['labels'])} {_prom_value(c['value'])}"
+                      for c in snap["counters"] if c["name"] == name]
+        lines.append(f"# TYPE {p}_last_run_timestamp_seconds gauge")
+        lines.append(f"{p}_last_run_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, out_dir: str | None = None) -> list[str]:
+        """JSON サマリーと Prometheus textfile を書き出す（tmp → rename で原子的に置換）"""
+        if not self.enabled:
+            return []
+        out_dir = out_dir or self.out_dir
+        snap = self.snapshot()
+        written = []
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            for fname, body in (
+                ("news_metrics.json", json.dumps(snap, ensure_ascii=False, indent=2)),
+                ("news_metrics.prom", self.prometheus_text(snap)),
+            ):
+                path = os.path.join(out_dir, fname)
+                tmp = path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(body)
+                os.replace(tmp, path)
+                written.append(path)
+        except Exception as e:
+            print(f"⚠️ メトリクス出力エラー: {e}", flush=True)
+        return written
+
+    def summary(self) -> str:
+        snap = self.snapshot()
+        parts = [f"{s['name']} {s['sum']:.2f}s/{s['count']}回" for s in snap["spans"] if not s["labels"]]
+        return "計測: " + (" / ".join(parts) if parts else "なし")
+
+
+# プロセス全体で共有
+METRICS = Metrics()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+近似重複（転載・見出し違いの同一記事）検出
+- 文字 n-gram（既定 3文字）の MinHash + LSH バンディング
+  ※ 単語分割不要なので 繁体中文 / 日本語 / 英語 の混在でもそのまま扱える
+- 1件あたりの照合は LSH バケットに入った候補だけ（全件比較しない）
+- 候補は shingle 集合の Jaccard 係数で確認し、閾値以上なら同一グループ
+- グループごとに代表1件を残し、重複件数（= 報道の広がり）を付与
+- group_key（例: 見出しで言及している銘柄の集合）が違う記事同士はまとめない
+  「台積電1月營收年增35%」と「廣達1月營收年增35%」のような定型見出しは Jaccard が高くても別記事
+"""
+
+import re
+import zlib
+import random
+import unicodedata
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+NEAR_DUP_THRESHOLD = 0.5    # Jaccard 係数がこれ以上なら同一記事
+NEAR_DUP_NUM_PERM = 48      # MinHash のハッシュ関数数
+NEAR_DUP_BANDS = 12         # LSH バンド数（48 / 12 = 4行/バンド → しきい値 ≈ 0.54）
+NEAR_DUP_SHINGLE = 3        # 文字 n-gram 長
+
+_PUNCT_RE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def strip_publisher_suffix(title: str, publisher: str | None = None) -> str:
+    """Google News の見出し末尾「 - 出典名」を除く"""
+    t = title or ""
+    if publisher and t.endswith(f" - {publisher}"):
+        return t[: -len(publisher) - 3]
+    if " - " in t:
+        head, tail = t.rsplit(" - ", 1)
+        if len(tail) <= 30:
+            return head
+    return t
+
+
+def normalize_for_shingles(text: str) -> str:
+    # 全角/半角の統一（NFKC）+ 小文字化 + 記号・空白の除去
+    t = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCT_RE.sub("", t)
+
+
+def shingles(text: str, k: int = NEAR_DUP_SHINGLE) -> set[str]:
+    t = normalize_for_shingles(text)
+    if not t:
+        return set()
+    if len(t) <= k:
+        return {t}
+    return {t[i:i + k] for i in range(len(t) - k + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateIndex:
+    """
+    逐次追加型の近似重複インデックス
+
+    add(text, group_key) は既存グループに一致すればそのグループ番号、無ければ新しいグループ番号を返す
+    group_key が違う文書とは一致させない（None 同士は同じキー扱い）
+    """
+
+    def __init__(self, threshold: float = NEAR_DUP_THRESHOLD,
+                 num_perm: int = NEAR_DUP_NUM_PERM,
+                 bands: int = NEAR_DUP_BANDS,
+                 shingle_size: int = NEAR_DUP_SHINGLE,
+                 seed: int = 5):
+        if num_perm % bands:
+            raise ValueError("num_perm は bands で割り切れる必要があります")
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(0, MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._buckets: list[dict[tuple, list[int]]] = [{} for _ in range(bands)]
+        self._shingles: list[set[str]] = []
+        self._keys: list = []
+        self._group: list[int] = []
+        self.group_count = 0
+
+    def _minhash(self, sh: set[str]) -> list[int]:
+        xs = [zlib.crc32(s.encode("utf-8")) for s in sh]
+        p = MERSENNE_PRIME
+        return [min((a * x + b) % p for x in xs) for a, b in self._perms]
+
+    def add(self, text: str, group_key=None) -> int:
+        sh = shingles(text, self.shingle_size)
+        doc = len(self._shingles)
+        self._shingles.append(sh)
+        self._keys.append(group_key)
+
+        group = None
+        band_keys = []
+        if sh:
+            sig = self._minhash(sh)
+            r = self.rows
+            band_keys = [tuple(sig[i * r:(i + 1) * r]) for i in range(self.bands)]
+            checked = set()
+            for band, key in enumerate(band_keys):
+                for other in self._buckets[band].get(key, ()):
+                    if other in checked:
+                        continue
+                    checked.add(other)
+                    if self._keys[other] != group_key:
+                        continue
+                    if jaccard(sh, self._shingles[other]) >= self.threshold:
+                        group = self._group[other]
+                        break
+                if group is not None:
+                    break
+
+        if group is None:
+            group = self.group_count
+            self.group_count += 1
+        self._group.append(group)
+
+        for band, key in enumerate(band_keys):
+            self._buckets[band].setdefault(key, []).append(doc)
+        return group
+
+
+def dedup_text(item: dict) -> str:
+    return strip_publisher_suffix(item.get("title_zh", ""), item.get("publisher"))
+
+
+def collapse_near_duplicates(items: list[dict], group_key=None, **index_kwargs) -> list[dict]:
+    """
+    近似重複をまとめ、グループごとに代表1件を返す（入力順を維持）
+
+    group_key: item → キー（キーが違う記事はまとめない。None なら見出しの類似度だけで判定）
+
+    代表: グループ内で最も早く公開された記事（初報）。日時不明は後回し
+    代表に付与するフィールド:
+        dup_count: 代表以外の重複件数（報道の広がり・coverage シグナル）
+        dup_publishers: 重複記事の出典名
+        feeds: グループ全体の出現フィード（和集合）
+    """
+    index = NearDuplicateIndex(**index_kwargs)
+    groups: dict[int, list[dict]] = {}
+    order: list[int] = []
+    for it in items:
+        g = index.add(dedup_text(it), group_key(it) if group_key else None)
+        if g not in groups:
+            groups[g] = []
+            order.append(g)
+        groups[g].append(it)
+
+    out = []
+    for g in order:
+        members = groups[g]
+        rep = min(members, key=lambda n: (n.get("published_ts") is None, n.get("published_ts") or 0))
+        others = [n for n in members if n is not rep]
+        rep["dup_count"] = len(others)
+        rep["dup_publishers"] = [n.get("publisher", "") for n in others]
+        feeds = list(rep.get("feeds") or [])
+        for n in others:
+            feeds += [f for f in (n.get("feeds") or []) if f not in feeds]
+        rep["feeds"] = feeds
+        out.append(rep)
+    return out
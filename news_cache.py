@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+台湾株ニュース配信システム v5 キャッシュストア（SQLite）
+- system_config.json の cache_path（環境変数 NEWS_CACHE_PATH で上書き可）に保存
+- セクション単位の key-value（news / topics / url_to_signature / feeds / llm_responses）
+  (section, key) を主キー、(section, updated_at) にインデックス
+- 書き込みはトランザクション単位 = 途中で落ちても壊れない
+  put / delete はメモリ上に溜め、CACHE_COMMIT_BATCH 件ごと、または最初の書き込みから
+  CACHE_COMMIT_INTERVAL_SEC 秒で1回の短いトランザクションにまとめて書く（save() は即時）
+  ※ 収集中ずっと書き込みロックを持つと clear_cache.py 等の別プロセスが busy_timeout で失敗するため、
+    ロックを持つのは書き出しの瞬間だけ
+- WAL モード: 実行中でも別プロセス（clear_cache.py 等）から安全に読める
+- cache_policy の保持日数で古いレコードを削除（compact）
+- 旧形式（JSON ファイル）が残っていれば初回に取り込む
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SYSTEM_CONFIG_PATH = os.path.join(BASE_DIR, "system_config.json")
+DEFAULT_CACHE_PATH = "/home/ubuntu/.taiwan_stock_news_cache_v5.sqlite3"
+
+# clear_cache.py がクリア対象とするセクション
+SECTIONS = ("news", "topics", "url_to_signature", "feeds", "llm_responses")
+
+# 保持日数の適用先（cache_policy のキー → セクション）
+RETENTION_SECTIONS = {
+    "news_retention_days": ("news", "url_to_signature", "feeds"),
+    "topic_retention_days": ("topics", "llm_responses"),
+}
+
+# 書き込みの溜め置き（件数 / 経過秒数のどちらかで書き出す）
+CACHE_COMMIT_BATCH = 200
+CACHE_COMMIT_INTERVAL_SEC = 1.0
+
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    section    TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (section, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_updated ON entries (section, updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def load_system_config() -> dict:
+    try:
+        with open(SYSTEM_CONFIG_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def retention_sec(policy_key: str, default_days: float) -> int:
+    """cache_policy の保持日数（news_retention_days / topic_retention_days 等）を秒で返す"""
+    days = load_system_config().get("cache_policy", {}).get(policy_key, default_days)
+    return int(float(days) * 86400)
+
+
+def resolve_cache_path() -> str:
+    env = os.getenv("NEWS_CACHE_PATH", "").strip()
+    if env:
+        return env
+    return load_system_config().get("cache_path") or DEFAULT_CACHE_PATH
+
+
+CACHE_PATH = resolve_cache_path()
+
+
+def _is_sqlite_file(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(_SQLITE_HEADER)) == _SQLITE_HEADER
+    except OSError:
+        return False
+
+
+class NewsCache:
+    """
+    v5 キャッシュのセクション付き key-value ストア
+
+    使い方:
+        cache = NewsCache()
+        cache.get("feeds", url) / cache.put("feeds", url, {...})
+        cache.save()   # 未コミットの変更を即時コミット（放っておいても一定件数・一定秒数でコミット）
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or CACHE_PATH
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._closed = False
+        # 未書き出しの変更: (section, key) → (JSON文字列, 更新時刻)。None は削除
+        self._pending: dict[tuple[str, str], tuple[str, float] | None] = {}
+        self._flush_timer: threading.Timer | None = None
+
+        legacy = self._take_legacy_json()
+        try:
+            d = os.path.dirname(self.path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._conn = self._connect(self.path)
+        except (OSError, sqlite3.Error) as e:
+            # 保存先が使えない環境（権限なし・壊れたファイル等）でも配信は止めない: 今回の実行内だけ有効
+            # ※ connect は遅延で開くため、壊れたファイルは PRAGMA / スキーマ作成の時点で失敗する
+            print(f"⚠️ キャッシュを開けません（メモリ上で継続）: {self.path} - {e}", flush=True)
+            self._conn = self._connect(":memory:")
+        if legacy:
+            self._import_legacy(legacy)
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level="DEFERRED")
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.executescript(_SCHEMA)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    # ---------- 旧JSON形式の取り込み ----------
+    def _take_legacy_json(self) -> dict | None:
+        """
+        cache_path が旧 JSON 形式、または同名の .json が残っていれば読み込み、
+        ファイルは *.migrated に退避する
+        """
+        candidates = []
+        if os.path.exists(self.path) and not _is_sqlite_file(self.path) and os.path.getsize(self.path) > 0:
+            candidates.append(self.path)
+        elif not os.path.exists(self.path):
+            stem_json = os.path.splitext(self.path)[0] + ".json"
+            if stem_json != self.path and os.path.exists(stem_json):
+                candidates.append(stem_json)
+        for src in candidates:
+            try:
+                with open(src, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                os.replace(src, src + ".migrated")
+                print(f"  旧キャッシュ（JSON）を取り込みます: {src}", flush=True)
+                return data if isinstance(data, dict) else None
+            except Exception as e:
+                print(f"⚠️ 旧キャッシュ取り込みエラー（無視）: {e}", flush=True)
+        return None
+
+    def _import_legacy(self, data: dict):
+        now = time.time()
+        with self._lock:
+            for sec in SECTIONS:
+                for key, value in (data.get(sec) or {}).items():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO entries (section, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                        (sec, key, json.dumps(value, ensure_ascii=False), now),
+                    )
+            self._conn.commit()
+
+    # ---------- key-value ----------
+    def get(self, section: str, key: str) -> dict | None:
+        with self._lock:
+            if (section, key) in self._pending:
+                pending = self._pending[(section, key)]
+                raw = pending[0] if pending is not None else None
+            else:
+                row = self._conn.execute(
+                    "SELECT value FROM entries WHERE section = ? AND key = ?", (section, key)
+                ).fetchone()
+                raw = row[0] if row is not None else None
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def put(self, section: str, key: str, value: dict):
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._pending[(section, key)] = (payload, time.time())
+            self._wrote()
+
+    def delete(self, section: str, key: str):
+        with self._lock:
+            self._pending[(section, key)] = None
+            self._wrote()
+
+    def _wrote(self):
+        """put / delete の後に呼ぶ（ロック内）: 件数に達したら書き出し、でなければ一定秒数後の書き出しを予約"""
+        self._dirty = True
+        if len(self._pending) >= CACHE_COMMIT_BATCH:
+            self.save()
+        elif self._flush_timer is None:
+            timer = threading.Timer(CACHE_COMMIT_INTERVAL_SEC, self.save)
+            timer.daemon = True
+            self._flush_timer = timer
+            timer.start()
+
+    def _flush(self):
+        """溜めた変更を書き出す（ロック内。コミットは呼び出し側）"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        upserts = [(sec, key, v[0], v[1]) for (sec, key), v in self._pending.items() if v is not None]
+        deletes = [(sec, key) for (sec, key), v in self._pending.items() if v is None]
+        self._pending.clear()
+        if upserts:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (section, key, value, updated_at) VALUES (?, ?, ?, ?)", upserts
+            )
+        if deletes:
+            self._conn.executemany("DELETE FROM entries WHERE section = ? AND key = ?", deletes)
+
+    def items(self, section: str) -> list[tuple[str, dict]]:
+        out = []
+        for key, raw in self.iter_raw(section):
+            try:
+                out.append((key, json.loads(raw)))
+            except ValueError:
+                out.append((key, None))
+        return out
+
+    def iter_raw(self, section: str, batch: int = 500):
+        """(key, JSON文字列) をバッチ単位で返す（セクション全体をメモリに載せない）"""
+        self.save()
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT key, value FROM entries WHERE section = ? AND key > ? ORDER BY key LIMIT ?",
+                    (section, last, batch),
+                ).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def count(self, section: str) -> int:
+        self.save()
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE section = ?", (section,)
+            ).fetchone()[0]
+
+    # ---------- 保守 ----------
+    def compact(self, policy: dict | None = None) -> int:
+        """
+        cache_policy の保持日数より古いレコード（最終更新基準）を削除し、WAL を切り詰める
+        Returns: 削除件数
+        """
+        policy = policy if policy is not None else load_system_config().get("cache_policy", {})
+        now = time.time()
+        removed = 0
+        with self._lock:
+            self._flush()
+            for conf_key, sections in RETENTION_SECTIONS.items():
+                days = policy.get(conf_key)
+                if not days:
+                    continue
+                cutoff = now - float(days) * 86400
+                for sec in sections:
+                    cur = self._conn.execute(
+                        "DELETE FROM entries WHERE section = ? AND updated_at < ?", (sec, cutoff)
+                    )
+                    removed += cur.rowcount
+            self._conn.commit()
+            self._dirty = False
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
+
+    def clear(self, sections=SECTIONS, cleared_by: str = "") -> dict[str, int]:
+        """指定セクションを削除（1トランザクション）。削除件数を返す"""
+        counts = {}
+        with self._lock:
+            self._flush()
+            for sec in sections:
+                counts[sec] = self._conn.execute("DELETE FROM entries WHERE section = ?", (sec,)).rowcount
+            self.set_meta("cleared_at", datetime.now().isoformat())
+            if cleared_by:
+                self.set_meta("cleared_by", cleared_by)
+            self._conn.commit()
+            self._dirty = False
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return counts
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._dirty = True
+
+    def get_meta(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def save(self):
+        """溜めた変更を書き出してコミット（トランザクション単位で原子的）"""
+        with self._lock:
+            if self._closed or not self._dirty:
+                return
+            try:
+                self._flush()
+                self.set_meta("updated_at", datetime.now().isoformat())
+                self._conn.commit()
+                self._dirty = False
+            except Exception as e:
+                # 書き込みロックを持ったままにしない
+                self._conn.rollback()
+                print(f"⚠️ キャッシュ保存エラー: {e}", flush=True)
+
+    def close(self):
+        with self._lock:
+            self.save()
+            self._closed = True
+            self._conn.close()
@@ -5,21 +5,32 @@
 - 論点クラスタによるニュース分類
 - 代表ニュース選択と補足情報統合
 - イベント集中度の判定
+- 分類は既定でローカル計算（local_clustering: TF-IDF + 群平均法、ネットワーク不要）
+  NEWS_CLUSTERING_BACKEND=llm で従来の LLM 分類
+  NEWS_CLUSTER_LLM_THEMES=1 ならローカル分類のテーマ名だけ LLM で付け直す（失敗時はローカルのまま）
 """
 
-import json
-import re
-from openai import OpenAI
+import os
 
-client = OpenAI()
+from llm_gateway import extract_json, get_gateway
+from local_clustering import cluster_news_locally
 
-def cluster_news_by_topic(stock_name, relevant_news):
+CLUSTERING_MODEL = "gpt-4.1-mini"
+CLUSTERING_SYSTEM = "あなたは台湾株の投資判断を支援するアナリストです。"
+CLUSTERING_BACKEND = os.getenv("NEWS_CLUSTERING_BACKEND", "local").strip().lower()
+CLUSTER_LLM_THEMES = os.getenv("NEWS_CLUSTER_LLM_THEMES", "0") == "1"
+
+def cluster_news_by_topic(stock_name, relevant_news, llm_cache=None,
+                          backend=CLUSTERING_BACKEND, llm_themes=CLUSTER_LLM_THEMES):
     """
     ニュースを論点クラスタで分類
     
     Args:
         stock_name: 銘柄名
         relevant_news: 関連ニュースリスト
+        llm_cache: LLMResponseCache（同一プロンプトの応答を再利用。None ならキャッシュなし）
+        backend: "local"（既定。NumPy が無ければ LLM に切り替え）/ "llm"
+        llm_themes: ローカル分類のテーマ名を LLM で付け直すか
     
     Returns:
         dict: {
@@ -40,6 +51,13 @@ def cluster_news_by_topic(stock_name, relevant_news):
             'event_description': None
         }
     
+    if backend == "local":
+        result = cluster_news_locally(relevant_news)
+        if result is not None:
+            if llm_themes:
+                name_cluster_themes(stock_name, result, llm_cache)
+            return result
+    
     # ニューステキストを準備
     news_text = "\n\n".join([
         f"[{i+1}] タイトル: {news['title']}\n"
@@ -95,20 +113,21 @@ def cluster_news_by_topic(stock_name, relevant_news):
 """
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": "あなたは台湾株の投資判断を支援するアナリストです。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
-        
-        result_text = response.choices[0].message.content.strip()
+        result_text = llm_cache.get(CLUSTERING_MODEL, prompt) if llm_cache else None
+        from_cache = result_text is not None
+        if not from_cache:
+            # クライアント共有・レート制御・再試行・遮断は llm_gateway（遮断中は下の except でフォールバック）
+            result_text = get_gateway().generate(
+                "openai", prompt,
+                model=CLUSTERING_MODEL,
+                system=CLUSTERING_SYSTEM,
+                temperature=0.3,
+            )["text"]
         # JSONを抽出
-        json_match = re.search(r'\{.*\}', result_text, re.DOTALL)
-        if json_match:
-            clustering_result = json.loads(json_match.group())
+        clustering_result = extract_json(result_text)
+        if clustering_result is not None:
+            if llm_cache and not from_cache:
+                llm_cache.put(CLUSTERING_MODEL, prompt, result_text)
             
             # インデックスを実際のニュースオブジェクトに変換
             clusters = []
@@ -141,6 +160,64 @@ def cluster_news_by_topic(stock_name, relevant_news):
         print(f"⚠️  クラスタリングエラー: {e}")
         return fallback_clustering(relevant_news)
 
+def name_cluster_themes(stock_name, clustering_result, llm_cache=None):
+    """
+    ローカル分類のテーマ名を LLM で付け直す（clustering_result をその場で更新）
+    分類・代表の選び方は変えない。失敗・遮断中はローカルのテーマ名のまま
+    """
+    clusters = clustering_result['clusters']
+    if not clusters:
+        return clustering_result
+    
+    cluster_text = "\n\n".join([
+        f"クラスタ {c['cluster_id']}:\n" + "\n".join(
+            f"  - {n['title']}" for n in [c['representative']] + c['supplementary']
+        )
+        for c in clusters
+    ])
+    prompt = f"""
+銘柄: {stock_name}
+
+以下はニュースを論点ごとにまとめたクラスタです。各クラスタに短い日本語のテーマ名を付けてください。
+（例：「米国工場×関税交渉」「営収発表×市場反応」「技術開発×競合動向」）
+
+{cluster_text}
+
+【出力形式】
+以下の形式でJSON出力してください:
+{{
+  "themes": [{{"cluster_id": 1, "theme": "テーマ名"}}],
+  "event_description": "全クラスタが同一の巨大イベントならそのイベント名、そうでなければ null"
+}}
+"""
+    
+    try:
+        result_text = llm_cache.get(CLUSTERING_MODEL, prompt) if llm_cache else None
+        from_cache = result_text is not None
+        if not from_cache:
+            result_text = get_gateway().generate(
+                "openai", prompt,
+                model=CLUSTERING_MODEL,
+                system=CLUSTERING_SYSTEM,
+                temperature=0.3,
+            )["text"]
+        data = extract_json(result_text)
+        if data is None:
+            return clustering_result
+        if llm_cache and not from_cache:
+            llm_cache.put(CLUSTERING_MODEL, prompt, result_text)
+        
+        themes = {t.get('cluster_id'): t.get('theme') for t in data.get('themes', []) if isinstance(t, dict)}
+        for c in clusters:
+            if themes.get(c['cluster_id']):
+                c['theme'] = themes[c['cluster_id']]
+        if clustering_result['is_single_event'] and data.get('event_description'):
+            clustering_result['event_description'] = data['event_description']
+    except Exception as e:
+        print(f"⚠️  テーマ命名エラー（ローカルのテーマ名を使用）: {e}")
+    
+    return clustering_result
+
 def fallback_clustering(relevant_news):
     """
     クラスタリング失敗時のフォールバック処理
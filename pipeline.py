@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+ストリーミング処理の部品（スレッド + 上限付きキュー）
+- 入力イテレータは専用スレッドで読み進め、上限付きキューでワーカーに渡す
+  ワーカーが詰まれば入力側が待つ（バックプレッシャー）= 保持件数は maxsize 程度で頭打ち
+- 結果は完了順に返す（全件そろうのを待たない）
+- 入力イテレータ側の例外は呼び出し元に伝える。fn の例外はその1件を捨てて続行
+"""
+
+import queue
+import threading
+
+_DONE = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    # 消費側が途中でやめた場合に備え、stop を見ながら待つ
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def bounded_imap_unordered(fn, source, workers: int = 8, maxsize: int = 64):
+    """
+    source の各要素に fn を workers 並列で適用し、完了順に結果を yield する
+
+    Args:
+        maxsize: 入力・出力キューの上限（= 先読み・滞留の上限）
+    """
+    in_q: queue.Queue = queue.Queue(maxsize=maxsize)
+    out_q: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    source_error: list[BaseException] = []
+
+    def feeder():
+        try:
+            for x in source:
+                if not _put(in_q, x, stop):
+                    return
+        except BaseException as e:
+            source_error.append(e)
+        finally:
+            for _ in range(workers):
+                if not _put(in_q, _DONE, stop):
+                    return
+
+    def worker():
+        while not stop.is_set():
+            try:
+                x = in_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if x is _DONE:
+                break
+            try:
+                r = fn(x)
+            except Exception:
+                continue
+            if not _put(out_q, r, stop):
+                return
+        _put(out_q, _DONE, stop)
+
+    threads = [threading.Thread(target=feeder, daemon=True)]
+    threads += [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+
+    try:
+        remaining = workers
+        while remaining:
+            r = out_q.get()
+            if r is _DONE:
+                remaining -= 1
+                continue
+            yield r
+    finally:
+        stop.set()
+        for t in threads:
+            t.join(timeout=1)
+
+    if source_error:
+        raise source_error[0]
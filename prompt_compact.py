@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Gemini に渡す候補リストの圧縮
+- 概要（RSS の summary）から HTML タグ・実体参照を除去
+  Google News の summary は「<a>見出し</a> <font>出典</font>」なので、
+  見出し・出典の繰り返しを除くと大半は空になる → 空なら概要行ごと省く
+- URL は送らない（モデルは候補番号で答えるだけ。リンクは手元の候補から付ける）
+- 日時は ISO 形式の秒・タイムゾーンを落として「YYYY-MM-DD HH:MM」
+- 候補は上から順に、見積もりトークン数が予算内に収まるところまで（最低1件）
+  ※ 先頭からの切り詰めなので、picked_index と候補の対応は変わらない
+"""
+
+import os
+import re
+import html
+
+from rate_limit import estimate_tokens
+from near_dedup import strip_publisher_suffix, normalize_for_shingles
+
+# 1銘柄ぶんの候補欄の見積もりトークン上限（プロンプトの固定部分は含まない）
+PROMPT_CANDIDATE_TOKEN_BUDGET = int(os.getenv("GEMINI_PROMPT_TOKEN_BUDGET", "1200"))
+SNIPPET_MAX_CHARS = 120
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_URL_RE = re.compile(r"https?://\S+")
+_WS_RE = re.compile(r"\s+")
+
+
+def strip_html(text: str) -> str:
+    t = _TAG_RE.sub(" ", text or "")
+    t = html.unescape(t).replace("\xa0", " ")
+    return _WS_RE.sub(" ", t).strip()
+
+
+def compact_snippet(snippet: str, title: str, publisher: str = "") -> str:
+    """HTML・URL・見出しと出典の繰り返しを除いた概要（情報が残らなければ空文字）"""
+    text = _URL_RE.sub(" ", strip_html(snippet))
+    for rep in (title, strip_publisher_suffix(title, publisher), publisher):
+        if rep and rep.strip():
+            text = text.replace(rep.strip(), " ")
+    text = _WS_RE.sub(" ", text).strip(" -|・")
+    rest = normalize_for_shingles(text)
+    # 残りが見出しの一部でしかない（または短すぎる）なら概要は不要
+    if len(rest) < 8 or rest in normalize_for_shingles(title):
+        return ""
+    if len(text) > SNIPPET_MAX_CHARS:
+        text = text[:SNIPPET_MAX_CHARS] + "…"
+    return text
+
+
+def compact_date(published: str | None) -> str:
+    # "2026-01-28T08:15:00+08:00" → "2026-01-28 08:15"
+    return (published or "")[:16].replace("T", " ")
+
+
+def format_candidate(i: int, n: dict, summary: dict | None = None) -> str:
+    title = n.get("title_zh", "")
+    publisher = n.get("publisher", "")
+    head = f"[{i}]（要約済み）" if summary else f"[{i}] "
+    lines = [head + strip_publisher_suffix(title, publisher)]
+    if summary:
+        # 要約済み: 概要の代わりに既存の日本語タイトルで判断させる
+        lines.append(f"日本語タイトル: {summary.get('title_ja', '')}")
+    lines.append(f"出典: {publisher} / {compact_date(n.get('published'))}")
+    if not summary:
+        snippet = compact_snippet(n.get("snippet", ""), title, publisher)
+        if snippet:
+            lines.append(f"概要: {snippet}")
+    return "\n".join(lines)
+
+
+def verbose_candidate_tokens(n: dict) -> int:
+    """圧縮前の形式（URL・ISO日時・生の概要つき）で送った場合の見積もりトークン数"""
+    return estimate_tokens(
+        f"[0] {n.get('title_zh', '')}\n出典: {n.get('publisher', '')}\n"
+        f"日時: {n.get('published') or ''}\n概要: {n.get('snippet', '')}\nURL: {n.get('link') or ''}\n"
+    )
+
+
+def fit_candidates(items: list[dict], budget: int = PROMPT_CANDIDATE_TOKEN_BUDGET) -> tuple[list[dict], dict]:
+    """
+    候補を上から予算内に収まるだけ残す（最低1件）
+
+    Returns:
+        (残した候補, {"kept", "dropped", "tokens", "verbose_tokens", "saved"})
+        verbose_tokens / saved は全候補を圧縮前の形式で送った場合との比較
+    """
+    kept: list[dict] = []
+    used = 0
+    for i, n in enumerate(items, 1):
+        t = estimate_tokens(format_candidate(i, n))
+        if kept and used + t > budget:
+            break
+        kept.append(n)
+        used += t
+    verbose = sum(verbose_candidate_tokens(n) for n in items)
+    return kept, {
+        "kept": len(kept),
+        "dropped": len(items) - len(kept),
+        "tokens": used,
+        "verbose_tokens": verbose,
+        "saved": max(0, verbose - used),
+    }
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+掲載元（パブリッシャー）フィルタ
+- Google News の entry.source（href / title）を使い、リダイレクト解決の前に除外判定
+- ドメインはサフィックス一致（x.com は x.com / m.x.com に一致し、box.com には一致しない）
+- system_config.json の publisher_filter で許可/拒否リストを設定可能
+    "publisher_filter": {
+        "deny_domains": [...],      # 追加で除外するドメイン
+        "allow_domains": [...],     # 空でなければ、このドメイン以外を除外
+        "deny_publishers": [...]    # 除外する出典名（entry.source.title と完全一致）
+    }
+- 除外理由（ルール）ごとに件数を集計
+"""
+
+import threading
+from collections import Counter
+from urllib.parse import urlparse
+
+from news_cache import load_system_config
+
+
+def url_host(url: str) -> str:
+    try:
+        return (urlparse(url or "").hostname or "").lower()
+    except Exception:
+        return ""
+
+
+def domain_matches(host: str, domains) -> bool:
+    """host が domains のいずれかと一致、またはそのサブドメインなら True"""
+    host = (host or "").lower().rstrip(".")
+    if not host:
+        return False
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+class PublisherFilter:
+    def __init__(self, sns_domains,
+                 deny_domains=(),
+                 allow_domains=(),
+                 deny_publishers=()):
+        self.sns_domains = tuple(d.lower() for d in sns_domains)
+        self.deny_domains = tuple(d.lower() for d in deny_domains)
+        self.allow_domains = tuple(d.lower() for d in allow_domains)
+        self.deny_publishers = {p.strip() for p in deny_publishers if p.strip()}
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, sns_domains) -> "PublisherFilter":
+        conf = load_system_config().get("publisher_filter", {}) or {}
+        return cls(
+            sns_domains,
+            deny_domains=conf.get("deny_domains", []),
+            allow_domains=conf.get("allow_domains", []),
+            deny_publishers=conf.get("deny_publishers", []),
+        )
+
+    def match(self, host: str, publisher: str | None = None) -> str | None:
+        """除外すべきならルール名、通過なら None"""
+        if publisher and publisher.strip() in self.deny_publishers:
+            return "deny_publisher"
+        if not host:
+            return None
+        if domain_matches(host, self.sns_domains):
+            return "sns"
+        if domain_matches(host, self.deny_domains):
+            return "deny_domain"
+        if self.allow_domains and not domain_matches(host, self.allow_domains):
+            return "not_allowed"
+        return None
+
+    def _count(self, rule: str | None, stage: str) -> bool:
+        if rule is None:
+            return False
+        with self._lock:
+            self.counts[f"{stage}:{rule}"] += 1
+        return True
+
+    def reject_entry(self, entry) -> bool:
+        """解決前判定（RSS の source メタデータのみ使用）"""
+        src = entry.get("source") or {}
+        host = url_host(src.get("href", ""))
+        return self._count(self.match(host, src.get("title")), "pre")
+
+    def reject_url(self, final_url: str, publisher: str | None = None) -> bool:
+        """解決後判定（source が無い entry の取りこぼし対策）"""
+        return self._count(self.match(url_host(final_url), publisher), "post")
+
+    def summary(self) -> str:
+        with self._lock:
+            if not self.counts:
+                return "掲載元フィルタ: 除外なし"
+            detail = ", ".join(f"{k}={v}" for k, v in sorted(self.counts.items()))
+        return f"掲載元フィルタ: {detail}"
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+LLM呼び出しのレート制御
+- トークンバケット（RPM: 1分あたりリクエスト数 / TPM: 1分あたりトークン数）
+- 429 / 5xx に対するジッター付き指数バックオフ再試行
+- 既定値は Gemini 無料枠（gemini-1.5-flash: 15 RPM / 1,000,000 TPM）
+  環境変数 GEMINI_RPM / GEMINI_TPM で上書き可能（OpenAI は OPENAI_RPM / OPENAI_TPM）
+"""
+
+import os
+import time
+import random
+import threading
+
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "200000"))
+
+LLM_RETRIES = 4              # 再試行回数（初回を除く）
+LLM_BACKOFF_BASE = 2.0       # バックオフ基準秒
+LLM_BACKOFF_MAX = 60.0       # 1回の待機の上限秒
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRYABLE_MARKERS = ("429", "RESOURCE_EXHAUSTED", "rate limit", "quota",
+                      "500", "502", "503", "504", "UNAVAILABLE", "INTERNAL", "DEADLINE_EXCEEDED")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    ざっくりトークン数（ASCII は 4文字≒1トークン、CJK 等は 1文字≒1トークン）
+    レート制御・予算計算用の見積もりで、課金計算には使わない
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+class TokenBucket:
+    """capacity まで貯まり、毎秒 rate_per_sec ずつ補充されるバケット"""
+
+    def __init__(self, rate_per_min: float, capacity: float | None = None):
+        self.rate_per_sec = rate_per_min / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_min)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_sec)
+        self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """amount を予約し、使用可能になるまでの待ち秒数を返す（負債として先取り）"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_sec
+
+    def acquire(self, amount: float = 1.0):
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class LLMRateLimiter:
+    """RPM と TPM の両方を満たすまで待つ"""
+
+    def __init__(self, rpm: int = GEMINI_RPM, tpm: int = GEMINI_TPM):
+        # 起動直後のバーストを抑えるため、リクエスト側の容量は控えめに
+        self.requests = TokenBucket(rpm, capacity=max(1, rpm // 3))
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, est_tokens: int = 0):
+        wait = max(self.requests.reserve(1), self.tokens.reserve(est_tokens) if est_tokens else 0.0)
+        if wait > 0:
+            time.sleep(wait)
+
+
+def error_status(e: Exception) -> int | None:
+    for attr in ("code", "status_code", "status"):
+        v = getattr(e, attr, None)
+        if isinstance(v, int):
+            return v
+    resp = getattr(e, "response", None)
+    v = getattr(resp, "status_code", None)
+    return v if isinstance(v, int) else None
+
+
+def is_retryable_error(e: Exception) -> bool:
+    status = error_status(e)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    msg = str(e)
+    return any(m.lower() in msg.lower() for m in _RETRYABLE_MARKERS)
+
+
+def call_with_retry(fn, *args,
+                    retries: int = LLM_RETRIES,
+                    base: float = LLM_BACKOFF_BASE,
+                    max_delay: float = LLM_BACKOFF_MAX,
+                    before_call=None,
+                    **kwargs):
+    """
+    fn(*args, **kwargs) を実行し、429/5xx なら full-jitter バックオフで再試行
+    before_call: 毎試行の直前に呼ぶ（レートリミッタの acquire など）
+    """
+    for attempt in range(retries + 1):
+        if before_call is not None:
+            before_call()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt >= retries or not is_retryable_error(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base * (2 ** attempt)))
+            print(f"  ↻ LLM再試行 {attempt + 1}/{retries}（{delay:.1f}s後）: {e}", flush=True)
+            time.sleep(delay)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+候補の関連度ランキング（LLM に渡す前のローカル選別）
+- 文字 n-gram（2〜3文字）の TF-IDF。単語分割不要なので 繁体中文 / 日本語 / 英語 混在でも可
+- 照合先（クエリ）は
+    銘柄プロファイル: 銘柄名・英名・別名・business_type
+    delayed_valuable_news の類型: 業績 / 技術・需給 / 政策
+- 全候補 × 全クエリを1回の行列積で採点（NumPy）
+    スコア = プロファイル類似度 + 類型類似度の最大値 × 重み + 新しさ + 報道の広がり（dup_count）
+- NumPy が無い環境では None を返し、呼び出し側は従来どおり新しい順で選ぶ
+"""
+
+import math
+import time
+
+from near_dedup import normalize_for_shingles, strip_publisher_suffix
+from prompt_compact import compact_snippet
+from delayed_valuable_news import VALUABLE_KEYWORD_CLASSES
+
+NGRAM_SIZES = (2, 3)
+W_PROFILE = 1.0          # 銘柄プロファイルとの類似度
+W_CLASS = 2.0            # 遅れても価値がある類型との類似度
+W_RECENCY = 0.15         # 新しさ（半減期 RECENCY_HALF_LIFE_DAYS）
+W_COVERAGE = 0.05        # 転載数（log1p(dup_count)）
+RECENCY_HALF_LIFE_DAYS = 3.0
+
+
+def char_ngrams(text: str, sizes=NGRAM_SIZES) -> list[str]:
+    t = normalize_for_shingles(text)
+    out = []
+    for k in sizes:
+        if len(t) >= k:
+            out += [t[i:i + k] for i in range(len(t) - k + 1)]
+    return out
+
+
+def candidate_text(n: dict) -> str:
+    # 概要は HTML・URL（Google News の記事ID等）・見出しの繰り返しを除いてから n-gram 化
+    title = n.get("title_zh", "")
+    snippet = compact_snippet(n.get("snippet", ""), title, n.get("publisher", ""))
+    return f"{strip_publisher_suffix(title, n.get('publisher'))} {snippet}"
+
+
+def stock_profile_text(stock_id: str, stock_info: dict) -> str:
+    parts = [stock_info.get("name", ""), stock_info.get("name_en", ""),
+             " ".join(stock_info.get("aliases") or []), stock_info.get("business_type", "")]
+    return " ".join(p for p in parts if p)
+
+
+def tfidf_matrix(docs: list[list[str]], np):
+    """docs（n-gram 列のリスト）→ L2 正規化した TF-IDF 行列（行 = 文書）"""
+    vocab: dict[str, int] = {}
+    rows, cols, vals = [], [], []
+    for r, grams in enumerate(docs):
+        counts: dict[int, int] = {}
+        for g in grams:
+            j = vocab.setdefault(g, len(vocab))
+            counts[j] = counts.get(j, 0) + 1
+        for j, c in counts.items():
+            rows.append(r)
+            cols.append(j)
+            vals.append(1.0 + math.log(c))          # sublinear tf
+    m = np.zeros((len(docs), max(1, len(vocab))), dtype=np.float32)
+    if vals:
+        m[np.asarray(rows), np.asarray(cols)] = np.asarray(vals, dtype=np.float32)
+    df = np.count_nonzero(m, axis=0)
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1.0
+    m *= idf.astype(np.float32)
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def rank_candidates(items: list[dict], stock_id: str, stock_info: dict,
+                    now_ts: float | None = None) -> list[tuple[float, dict]] | None:
+    """
+    Returns:
+        [(スコア, 候補), ...] スコアの高い順（同点は元の順 = 新しい順）
+        NumPy が無ければ None
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    if not items:
+        return []
+    now_ts = now_ts if now_ts is not None else time.time()
+
+    queries = [stock_profile_text(stock_id, stock_info)]
+    queries += [" ".join(kws) for kws in VALUABLE_KEYWORD_CLASSES.values()]
+    docs = [char_ngrams(candidate_text(n)) for n in items] + [char_ngrams(q) for q in queries]
+
+    m = tfidf_matrix(docs, np)
+    d, q = m[:len(items)], m[len(items):]
+    sim = d @ q.T                                      # (候補数, クエリ数) を1回で
+
+    ts = np.array([float(n.get("published_ts") or 0.0) for n in items])
+    age_days = np.clip((now_ts - ts) / 86400.0, 0.0, None)
+    recency = np.where(ts > 0, np.power(0.5, age_days / RECENCY_HALF_LIFE_DAYS), 0.0)
+    coverage = np.log1p(np.array([float(n.get("dup_count") or 0) for n in items]))
+
+    score = (W_PROFILE * sim[:, 0] + W_CLASS * sim[:, 1:].max(axis=1)
+             + W_RECENCY * recency + W_COVERAGE * coverage)
+    order = np.argsort(-score, kind="stable")
+    return [(round(float(score[i]), 4), items[i]) for i in order]
@@ -17,27 +17,38 @@ VERSION = "v5.2-gemini-free-stable-20260128"
 
 import os
 import re
+import sys
 import json
 import time
 import hashlib
-import requests
-import feedparser
-from datetime import datetime, timedelta
+import threading
+from bisect import bisect_right
+from datetime import datetime
+from zoneinfo import ZoneInfo
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-import pytz
-from dateutil import parser as date_parser
-
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-
-# Gemini SDK (Google GenAI SDK)
-# pip install google-genai
-from google import genai  # type: ignore
-
-
-TW_TZ = pytz.timezone("Asia/Taipei")
+from concurrent.futures import ThreadPoolExecutor
+
+# 重い SDK（sendgrid / google-genai / feedparser / dateutil）は使う段階で import する
+# → clear_cache.py やドライランの起動を軽くする（bench_startup.py で計測）
+from feed_fetcher import iter_feeds, parse_feed_date
+from news_cache import NewsCache
+from url_resolver import UrlResolutionCache, decode_google_news_url, decode_summary
+from publisher_filter import PublisherFilter, domain_matches, url_host
+from http_pool import get_pool
+from keyword_index import StockMatcher, StockKeywordIndex
+from near_dedup import collapse_near_duplicates, dedup_text
+from rate_limit import estimate_tokens
+from llm_gateway import LLMUnavailable, extract_json, get_gateway
+from llm_cache import LLMResponseCache
+from article_store import ArticleSummaryStore
+from pipeline import bounded_imap_unordered
+from metrics import METRICS
+from prompt_compact import fit_candidates, format_candidate
+from relevance_ranker import rank_candidates
+from incremental import FeedWatermarks, RetainedNewsStore
+
+
+TW_TZ = ZoneInfo("Asia/Taipei")
 
 # ==========================
 # 環境変数（必須）
@@ -54,6 +65,21 @@ EMAIL_TO_CC = os.getenv("EMAIL_TO_CC", "").strip()
 # Geminiモデル（無料枠で使いやすい軽量系）
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash").strip()
 
+# 銘柄の並列処理数（= 同時に走る Gemini 呼び出しの上限）
+GEMINI_MAX_CONCURRENCY = max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")))
+
+# 複数銘柄まとめ送信（1リクエストに複数銘柄の候補を詰める。無料枠の RPD 節約用）
+GEMINI_BATCH_MODE = os.getenv("GEMINI_BATCH_MODE", "0").strip() == "1"
+GEMINI_BATCH_TOKEN_BUDGET = int(os.getenv("GEMINI_BATCH_TOKEN_BUDGET", "8000"))  # 1リクエストの入力見積もり上限
+GEMINI_BATCH_MAX_STOCKS = int(os.getenv("GEMINI_BATCH_MAX_STOCKS", "8"))
+
+# 関連度ランキング後に Gemini へ渡す候補数（NumPy が無い場合は従来どおり新しい順に10件）
+RELEVANCE_SHORTLIST = max(1, int(os.getenv("RELEVANCE_SHORTLIST", "6")))
+
+# 差分実行（既読 entry は解決せず、前回までの解決済み記事と合わせて候補にする）
+# NEWS_INCREMENTAL=0 で毎回全件を処理（除外ルール変更直後など）
+NEWS_INCREMENTAL = os.getenv("NEWS_INCREMENTAL", "1").strip() != "0"
+
 # ==========================
 # 銘柄データ読み込み
 # ==========================
@@ -61,7 +87,9 @@ def load_stocks():
     """
     同一ディレクトリの stocks.json を読む。
     形式:
-    { "stocks": { "2330": {"name":"台積電","business_type":"..."}, ... } }
+    { "stocks": { "2330": {"name":"台積電","business_type":"...",
+                           "name_en":"TSMC","aliases":[...],"exclude":[...]}, ... } }
+    name_en / aliases / exclude は任意（別名テーブル。stock_keywords を参照）
     """
     base_dir = os.path.dirname(os.path.abspath(__file__))
     path = os.path.join(base_dir, "stocks.json")
@@ -111,6 +139,10 @@ RSS_FEEDS = [
     "https://news.google.com/rss/search?q=廣達+營收&hl=zh-TW&gl=TW&ceid=TW:zh-Hant",
 ]
 
+# URL解決の並列数と、段間キューの上限（= 取得済み・未解決の entry の滞留上限）
+RESOLVE_WORKERS = 10
+RESOLVE_QUEUE_SIZE = 64
+
 SNS_DOMAINS = [
     "threads.net", "instagram.com", "line.me", "linkedin.com",
     "tiktok.com", "youtube.com", "youtu.be", "facebook.com", "x.com", "twitter.com"
@@ -120,9 +152,18 @@ SNS_DOMAINS = [
 # ==========================
 # ユーティリティ
 # ==========================
+_OUTPUT_LOCK = threading.Lock()
+
+def print_block(lines: list[str]):
+    # 複数行のログを1回の write で出す（並列処理中の銘柄ログが行の途中で混ざらないように）
+    text = "\n".join(lines) + "\n"
+    with _OUTPUT_LOCK:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
 def is_sns_domain(url: str) -> bool:
-    u = (url or "").lower()
-    return any(d in u for d in SNS_DOMAINS)
+    # ホスト名のサフィックス一致（"x.com" が無関係なホストに部分一致しないように）
+    return domain_matches(url_host(url), SNS_DOMAINS)
 
 def clean_url(url: str) -> str:
     parsed = urlparse(url)
@@ -135,12 +176,24 @@ def clean_url(url: str) -> str:
     clean_query = urlencode(clean_params, doseq=True)
     return urlunparse(parsed._replace(query=clean_query))
 
-def resolve_final_url(url: str, timeout: int = 3) -> str | None:
+def resolve_final_url(url: str, timeout: int = 3, url_cache: UrlResolutionCache | None = None) -> str | None:
+    # Google News 記事IDから掲載元URLを復号できればネットワーク不要
+    decoded = decode_google_news_url(url)
+    if decoded:
+        return clean_url(decoded)
+    if url_cache is not None:
+        hit, final_url = url_cache.lookup(url)
+        if hit:
+            return final_url
     try:
-        r = requests.head(url, allow_redirects=True, timeout=timeout)
-        return clean_url(r.url)
+        r = get_pool().head(url, allow_redirects=True, timeout=timeout)
+        # 404/410/5xx はリンク切れ・一時障害 → 失敗扱い（短時間の失敗キャッシュ）
+        final_url = clean_url(r.url) if r.status_code < 400 else None
     except Exception:
-        return None
+        final_url = None
+    if url_cache is not None:
+        url_cache.store(url, final_url)
+    return final_url
 
 def normalize_text(s: str) -> str:
     s = (s or "").lower()
@@ -155,7 +208,8 @@ def parse_pub_date(entry) -> datetime | None:
     pub_date = None
     if hasattr(entry, "published"):
         try:
-            pub_date = date_parser.parse(entry.published).astimezone(TW_TZ)
+            d = parse_feed_date(entry.published)
+            pub_date = d.astimezone(TW_TZ) if d else None
         except Exception:
             pub_date = None
     return pub_date
@@ -178,19 +232,32 @@ def safe_get_publisher(entry, final_url: str) -> str:
 # ==========================
 # RSS収集
 # ==========================
-def process_rss_entry(entry) -> dict | None:
+def process_rss_entry(entry,
+                      url_cache: UrlResolutionCache | None = None,
+                      pub_filter: PublisherFilter | None = None,
+                      on_unresolved=None) -> dict | None:
+    """
+    on_unresolved: URL解決に失敗したとき entry を渡して呼ぶ
+                   （掲載元フィルタで落とした場合は呼ばない = 差分実行で既読にしてよいかの区別）
+    """
     rss_url = entry.get("link", "")
     title = entry.get("title", "")
     snippet = (entry.get("summary", "") or "")[:240]
 
-    final_url = resolve_final_url(rss_url, timeout=3)
+    final_url = resolve_final_url(rss_url, timeout=3, url_cache=url_cache)
     if not final_url:
+        if on_unresolved is not None:
+            on_unresolved(entry)
         return None
-    if is_sns_domain(final_url):
+
+    publisher = safe_get_publisher(entry, final_url)
+    if pub_filter is not None:
+        if pub_filter.reject_url(final_url, publisher):
+            return None
+    elif is_sns_domain(final_url):
         return None
 
     pub_date = parse_pub_date(entry)
-    publisher = safe_get_publisher(entry, final_url)
 
     sig = signature_for_item(title, final_url)
 
@@ -199,41 +266,166 @@ def process_rss_entry(entry) -> dict | None:
         "snippet": snippet,
         "publisher": publisher,
         "published": pub_date.isoformat() if pub_date else None,
+        "published_ts": pub_date.timestamp() if pub_date else None,
         "link": final_url,
         "signature": sig,
     }
 
-def collect_news_parallel(max_entries_per_feed: int = 20) -> list[dict]:
-    print("📰 RSSフィードからニュース収集中...", flush=True)
-    all_entries = []
+def entry_dedup_keys(entry) -> list[str]:
+    """解決前の重複判定キー（guid / RSSリンク / 正規化タイトル）"""
+    keys = []
+    guid = entry.get("id") or entry.get("guid")
+    if guid:
+        keys.append(f"id:{guid}")
+    link = entry.get("link")
+    if link:
+        keys.append(f"link:{link}")
+    title = normalize_text(entry.get("title", ""))
+    if title:
+        keys.append(f"title:{title}")
+    return keys
+
+class EntryDeduper:
+    """
+    解決前の重複判定（フィードが届くたびに add する）
 
-    for feed_url in RSS_FEEDS:
-        try:
-            feed = feedparser.parse(feed_url)
-            all_entries.extend(feed.entries[:max_entries_per_feed])
-        except Exception as e:
-            print(f"⚠️ RSS収集エラー: {feed_url} - {e}", flush=True)
+    add は初出の entry なら出現フィードのリスト（以降の重複で追記される）、既出なら None を返す
+    """
 
-    print(f"  RSS収集完了: {len(all_entries)}件", flush=True)
+    def __init__(self):
+        self._key_to_feeds: dict[str, list[str]] = {}
+        self.seen = 0
+        self.unique = 0
+
+    def add(self, feed_url: str, entry) -> list[str] | None:
+        self.seen += 1
+        keys = entry_dedup_keys(entry)
+        feeds = next((self._key_to_feeds[k] for k in keys if k in self._key_to_feeds), None)
+        is_new = feeds is None
+        if is_new:
+            feeds = [feed_url]
+            self.unique += 1
+        elif feed_url not in feeds:
+            feeds.append(feed_url)
+        for k in keys:
+            self._key_to_feeds.setdefault(k, feeds)
+        return feeds if is_new else None
+
+def collect_news_parallel(max_entries_per_feed: int = 20, cache: NewsCache | None = None,
+                          incremental: bool = NEWS_INCREMENTAL,
+                          feed_urls: list[str] | None = None,
+                          matcher: StockMatcher | None = None) -> list[dict]:
+    """
+    フィード取得 → 既読除外 → 解決前の重複除外 → 掲載元フィルタ → URL解決 → signature 重複除外
+    を1本のストリームで流す（届いたフィードの entry から順に解決を始める）
+    各段の間は上限付きキューでつなぎ、解決が詰まれば取得側が待つ
+    feed_urls: 取得するフィードURL（None なら RSS_FEEDS。ベンチマーク用に差し替え可能）
+    matcher: 近似重複の集約で見出しの言及銘柄を比べる照合器（None ならここで作る）
+    """
+    print("📰 RSSフィードからニュース収集中...", flush=True)
+    t_start = time.perf_counter()
+
+    # 差分実行: フィードごとの high-water mark で既読 entry を落とす
+    marks = FeedWatermarks(cache) if cache is not None and incremental else None
+    retained = RetainedNewsStore(cache) if cache is not None and incremental else None
+
+    # 重複クエリ（DRAM価格・NVIDIA・CoWoS 等）の同一記事は解決前に1件へ
+    deduper = EntryDeduper()
+    # SNS・除外パブリッシャーは RSS の source メタデータで解決前に落とす
+    pub_filter = PublisherFilter.from_config(SNS_DOMAINS)
+    # リダイレクト解決結果はキャッシュ（成功: 保持期間まで / 失敗: 短時間）
+    url_cache = UrlResolutionCache(cache) if cache is not None else None
+
+    fetched = 0
+
+    def unique_entries():
+        nonlocal fetched
+        # フィード取得は全フィード同時（ホスト単位の同時接続数は http_pool 側で制限）
+        # cache があれば ETag/Last-Modified で条件付きGET（304 はキャッシュ済み entries を再利用）
+        for feed_url, entries in iter_feeds(RSS_FEEDS if feed_urls is None else feed_urls, cache=cache):
+            entries = entries[:max_entries_per_feed]
+            fetched += len(entries)
+            if marks is not None:
+                entries = marks.filter_new(feed_url, entries)
+            for ent in entries:
+                feeds = deduper.add(feed_url, ent)
+                if feeds is None or pub_filter.reject_entry(ent):
+                    # 重複・除外パブリッシャーは意図的に落とす → 既読にしてよい
+                    if marks is not None:
+                        marks.mark_seen(feed_url, ent)
+                    continue
+                yield ent, feeds
 
-    items: list[dict] = []
-    seen = set()
+    def resolve(pair):
+        ent, feeds = pair
+        unresolved = []
+        with METRICS.span("resolve_entry"):
+            it = process_rss_entry(ent, url_cache, pub_filter, on_unresolved=unresolved.append)
+        return it, ent, feeds, not unresolved
 
-    with ThreadPoolExecutor(max_workers=10) as ex:
-        futures = [ex.submit(process_rss_entry, ent) for ent in all_entries]
-        for i, fut in enumerate(as_completed(futures), 1):
-            if i % 100 == 0:
-                print(f"  処理中: {i}/{len(all_entries)}件", flush=True)
-            try:
-                it = fut.result()
-                if not it:
-                    continue
-                if it["signature"] in seen:
-                    continue
-                seen.add(it["signature"])
-                items.append(it)
-            except Exception:
-                continue
+    items: list[dict] = []
+    # signature → 出現フィードのリスト群（解決前の重複判定で後から追記されうるので最後に確定）
+    by_sig: dict[str, tuple[dict, list[list[str]]]] = {}
+    first_item_at = None
+
+    for i, (it, ent, feeds, resolved) in enumerate(bounded_imap_unordered(
+            resolve, unique_entries(), workers=RESOLVE_WORKERS, maxsize=RESOLVE_QUEUE_SIZE), 1):
+        if i % 100 == 0:
+            print(f"  処理中: {i}件", flush=True)
+        # 解決失敗は既読にしない（次回また解決を試みる）
+        if marks is not None and resolved:
+            marks.mark_seen(feeds[0], ent)
+        if not it:
+            continue
+        if first_item_at is None:
+            first_item_at = time.perf_counter() - t_start
+        prev = by_sig.get(it["signature"])
+        if prev is not None:
+            prev[1].append(feeds)
+            continue
+        by_sig[it["signature"]] = (it, [feeds])
+        items.append(it)
+
+    for it, feed_lists in by_sig.values():
+        it["feeds"] = list(dict.fromkeys(f for fl in feed_lists for f in fl))
+
+    METRICS.incr("entries_fetched", fetched)
+    METRICS.incr("entries_unique", deduper.unique)
+    METRICS.incr("items_resolved", len(items))
+    print(f"  RSS収集完了: {fetched}件", flush=True)
+    if marks is not None:
+        print(f"  {marks.summary()}", flush=True)
+    print(f"  解決前の重複除外: {deduper.seen}件 → {deduper.unique}件", flush=True)
+    if first_item_at is not None:
+        print(f"  最初の記事まで: {first_item_at:.2f}s / 解決完了まで: {time.perf_counter() - t_start:.2f}s",
+              flush=True)
+    print(f"  {decode_summary()}", flush=True)
+    print(f"  {pub_filter.summary()}", flush=True)
+    print(f"  {get_pool().summary()}", flush=True)
+    if url_cache is not None:
+        url_cache.prune()
+        print(f"  {url_cache.summary()}", flush=True)
+
+    if marks is not None:
+        # 新着を保存してから既読を確定し、前回までの解決済み記事と合流
+        for it in items:
+            retained.put(it)
+        marks.commit()
+        for old in retained.load(exclude=set(by_sig)):
+            items.append(old)
+        retained.prune()
+        print(f"  {retained.summary()}", flush=True)
+
+    # 転載・見出し違いの同一記事は代表1件に（dup_count = 報道の広がり）
+    # 言及銘柄が違う見出しはまとめない（定型見出しの別銘柄ニュースを消さない）
+    matcher = matcher if matcher is not None else build_stock_matcher()
+    # items は解決スレッドの完了順。LSH のグループ連鎖は投入順に依存するので、
+    # 公開日時 → signature の順に並べてから集約（同じ入力なら毎回同じ結果 = LLM キャッシュのキーも安定）
+    items.sort(key=lambda it: (it.get("published_ts") is None, it.get("published_ts") or 0.0,
+                               it.get("signature") or ""))
+    before = len(items)
+    items = collapse_near_duplicates(items, group_key=lambda it: mentioned_stocks(matcher, dedup_text(it)))
+    print(f"  近似重複の集約: {before}件 → {len(items)}件", flush=True)
 
     print(f"✅ 重複除外後: {len(items)}件", flush=True)
     return items
@@ -243,62 +435,72 @@ def collect_news_parallel(max_entries_per_feed: int = 20) -> list[dict]:
 # 検索範囲の段階拡張
 # today / weekly / monthly
 # ==========================
-def within_days(pub_iso: str | None, days: int) -> bool:
-    if not pub_iso:
-        return False
-    try:
-        d = datetime.fromisoformat(pub_iso)
-        if d.tzinfo is None:
-            d = TW_TZ.localize(d)
-        return d >= (datetime.now(TW_TZ) - timedelta(days=days))
-    except Exception:
-        return False
+def published_ts(n: dict) -> float:
+    """
+    epoch秒（取り込み時に published_ts として付与済み。無い場合のみ ISO を1回パースして保存）
+    日時不明は 0（= 最も古い扱い）
+    """
+    ts = n.get("published_ts")
+    if ts is None:
+        ts = 0.0
+        p = n.get("published")
+        if p:
+            try:
+                d = datetime.fromisoformat(p)
+                if d.tzinfo is None:
+                    d = d.replace(tzinfo=TW_TZ)
+                ts = d.timestamp()
+            except Exception:
+                ts = 0.0
+        n["published_ts"] = ts
+    return ts or 0.0
 
 def stock_keywords(stock_id: str, stock_info: dict) -> list[str]:
-    kws = [stock_info.get("name",""), stock_id]
-    # よくある英名
-    name = stock_info.get("name","")
-    if stock_id == "2330":
-        kws += ["TSMC", "台積電", "tsmc"]
-    if stock_id == "2451":
-        kws += ["Transcend", "創見", "transcend"]
-    if stock_id == "8271":
-        kws += ["Apacer", "宇瞻", "apacer"]
-    if stock_id == "2382":
-        kws += ["Quanta", "廣達", "quanta", "Quanta Computer"]
-    # 空要素除去
-    return [k for k in kws if k]
-
-def pick_candidates_for_stock(all_news: list[dict], stock_id: str, stock_info: dict) -> list[dict]:
-    kws = stock_keywords(stock_id, stock_info)
+    # 銘柄名・コード + stocks.json の別名テーブル（英名・略称など）
+    kws = [stock_info.get("name",""), stock_id, stock_info.get("name_en","")]
+    kws += list(stock_info.get("aliases") or [])
+    # 空要素・重複除去
+    return list(dict.fromkeys(k for k in kws if k))
+
+def stock_excludes(stock_info: dict) -> list[str]:
+    # 含まれていたらその銘柄の候補にしない語（同名の別企業・一般語の誤ヒット対策）
+    return [k for k in (stock_info.get("exclude") or []) if k]
+
+def business_keyword(stock_info: dict) -> str:
+    # 業種ワード（business_type 先頭6文字）
+    return (stock_info.get("business_type") or "").strip()[:6]
+
+def build_stock_matcher(stocks: dict | None = None) -> StockMatcher:
+    """起動時に1回だけ作る: 全銘柄の別名テーブルをコンパイルした照合器"""
+    stocks = STOCKS if stocks is None else stocks
+    return StockMatcher(
+        {sid: stock_keywords(sid, info) for sid, info in stocks.items()},
+        {sid: business_keyword(info) for sid, info in stocks.items()},
+        {sid: stock_excludes(info) for sid, info in stocks.items()},
+    )
+
+def mentioned_stocks(matcher: StockMatcher, text: str) -> frozenset[str]:
+    """text が銘柄名・別名で言及している銘柄コードの集合"""
+    return frozenset(sid for sid, kind in matcher.match(text) if kind == StockMatcher.KEYWORD)
+
+def build_keyword_index(all_news: list[dict], stocks: dict | None = None) -> StockKeywordIndex:
+    """収集後に1回だけ作る: 全銘柄キーワード → ニュースの転置インデックス"""
+    return build_stock_matcher(stocks).index(all_news)
+
+def pick_candidates_for_stock(all_news: list[dict], stock_id: str, stock_info: dict,
+                              index: StockKeywordIndex | None = None) -> list[dict]:
+    if index is None:
+        index = build_keyword_index(all_news, {stock_id: stock_info})
 
     # まずキーワードヒット
-    candidates = []
-    for n in all_news:
-        text = f"{n.get('title_zh','')} {n.get('snippet','')}"
-        if any(kw in text for kw in kws):
-            candidates.append(n)
+    candidates = index.keyword_hits(stock_id)
 
     # もし少なすぎるなら業界ワードも許可（補助）
     if len(candidates) < 5:
-        bt = (stock_info.get("business_type") or "").strip()
-        if bt:
-            for n in all_news:
-                if n in candidates:
-                    continue
-                text = f"{n.get('title_zh','')} {n.get('snippet','')}"
-                if bt[:6] and bt[:6] in text:
-                    candidates.append(n)
+        candidates += index.business_hits(stock_id, exclude=candidates)
 
-    # 日付が新しい順
-    def sort_key(n):
-        p = n.get("published")
-        try:
-            return datetime.fromisoformat(p) if p else datetime(1970,1,1, tzinfo=TW_TZ)
-        except Exception:
-            return datetime(1970,1,1, tzinfo=TW_TZ)
-
-    candidates.sort(key=sort_key, reverse=True)
+    # 日付が新しい順（split_by_recency はこの並びを前提に二分探索する）
+    candidates.sort(key=published_ts, reverse=True)
 
     # 同じドメイン・似たタイトルが連続するのを軽く抑制
     dedup = []
@@ -316,38 +518,48 @@ def pick_candidates_for_stock(all_news: list[dict], stock_id: str, stock_info: d
 
     return dedup
 
-def split_by_recency(cands: list[dict]) -> dict:
-    today = [c for c in cands if within_days(c.get("published"), 1)]
-    weekly = [c for c in cands if within_days(c.get("published"), 7)]
-    monthly = [c for c in cands if within_days(c.get("published"), 30)]
+def split_by_recency(cands: list[dict], now_ts: float | None = None) -> dict:
+    """
+    cands は新しい順（pick_candidates_for_stock の戻り値）
+    now_ts は実行全体で共通の基準時刻（銘柄間で境界がずれないように main で1回だけ取る）
+    """
+    if now_ts is None:
+        now_ts = time.time()
+    # 新しい順 = -ts の昇順。ts >= cutoff の件数を二分探索で求める
+    def count_since(days: int) -> int:
+        cutoff = now_ts - days * 86400
+        return bisect_right(cands, -cutoff, key=lambda c: -published_ts(c))
+
+    today = cands[:count_since(1)]
+    weekly = cands[:count_since(7)]
+    monthly = cands[:count_since(30)]
     return {"today": today, "weekly": weekly, "monthly": monthly}
 
 
 # ==========================
 # Gemini（1銘柄1回）で「最重要1本」+「日本語」+「要点」
 # ==========================
-def gemini_client():
-    # GEMINI_API_KEY は環境変数から自動取得されるが、明示指定も可能
-    if not GEMINI_API_KEY:
-        return None
-    try:
-        return genai.Client(api_key=GEMINI_API_KEY)
-    except Exception:
-        return None
+# クライアント・無料枠の RPM/TPM・同時実行数・再試行・遮断は llm_gateway で全銘柄共有
+# （GEMINI_RPM / GEMINI_TPM / GEMINI_MAX_CONCURRENCY で変更可）
+
+# 要約済み候補がある場合だけプロンプトに加える指示
+SUMMARIZED_NOTE = """
+【要約済みの候補】
+- 「要約済み」と付いた候補は日本語タイトル・要点が既にある
+- 要約済みの候補を選んだ場合は picked_index のみ出力（title_ja / title_zh / bullets / why_this は省略）
+"""
 
-def build_gemini_prompt(stock_id: str, stock_name: str, bucket: str, items: list[dict]) -> str:
-    lines = []
-    for i, n in enumerate(items, 1):
-        pub = n.get("published") or ""
-        lines.append(
-            f"[{i}] {n.get('title_zh','')}\n"
-            f"出典: {n.get('publisher','')}\n"
-            f"日時: {pub}\n"
-            f"概要: {n.get('snippet','')}\n"
-            f"URL: {n.get('link','')}\n"
-        )
+def format_candidates(items: list[dict], summaries: dict[str, dict] | None = None) -> str:
+    # URL は送らない・概要は HTML と見出しの繰り返しを除く（prompt_compact）
+    return "\n\n".join(
+        format_candidate(i, n, (summaries or {}).get(n.get("signature")))
+        for i, n in enumerate(items, 1)
+    )
 
-    body = "\n\n".join(lines)
+def build_gemini_prompt(stock_id: str, stock_name: str, bucket: str, items: list[dict],
+                        summaries: dict[str, dict] | None = None) -> str:
+    body = format_candidates(items, summaries)
+    note = SUMMARIZED_NOTE if summaries else ""
 
     return f"""以下は台湾株ニュース候補です。
 
@@ -372,34 +584,210 @@ def build_gemini_prompt(stock_id: str, stock_name: str, bucket: str, items: list
 - 数値や事実は原文に基づく
 - 断定しすぎない（可能性/見通し等は原文がそう述べる場合のみ）
 - 3〜4行に収まる粒度
-
+{note}
 【ニュース候補】
 {body}
 """
 
-def gemini_pick_one(stock_id: str, stock_name: str, bucket: str, items: list[dict]) -> dict | None:
-    client = gemini_client()
-    if not client:
-        return None
+def build_gemini_batch_prompt(ctxs: list[dict]) -> str:
+    """複数銘柄ぶんの候補を1プロンプトに詰める（応答は銘柄コードをキーにした JSON）"""
+    sections = []
+    for c in ctxs:
+        sections.append(
+            f"===== 銘柄 {c['stock_id']} =====\n"
+            f"【銘柄】{c['name']}（{c['stock_id']}）\n"
+            f"【カテゴリ】{c['bucket']}（today/weekly/monthly）\n"
+            f"【ニュース候補】\n{format_candidates(c['shortlist'], c.get('summaries'))}"
+        )
+    body = "\n\n".join(sections)
+    note = SUMMARIZED_NOTE if any(c.get("summaries") for c in ctxs) else ""
+    keys = ", ".join(f'"{c["stock_id"]}": {{...}}' for c in ctxs)
 
-    prompt = build_gemini_prompt(stock_id, stock_name, bucket, items)
+    return f"""以下は複数銘柄の台湾株ニュース候補です。銘柄ごとに独立して選んでください。
 
+【目的】（銘柄ごと）
+- 日本人投資家向けに「投資判断に有用な最重要1本」を1つだけ選ぶ
+- 自然で読みやすい日本語タイトルを付ける（中国語原文の上に表示する想定）
+- 要点を3つに絞る（推測しない、原文の範囲で）
+
+【出力形式】※JSONのみ、前後に文章を付けない。キーは銘柄コード（全銘柄ぶん必須）
+{{{keys}}}
+各銘柄の値:
+{{
+  "picked_index": 1,
+  "title_ja": "日本語タイトル（自然）",
+  "title_zh": "原文タイトル（そのまま）",
+  "bullets": ["要点1","要点2","要点3"],
+  "why_this": "なぜ重要か（1文、事実ベース）"
+}}
+※ picked_index はその銘柄の候補番号（[1] から）
+
+【注意】
+- 数値や事実は原文に基づく
+- 断定しすぎない（可能性/見通し等は原文がそう述べる場合のみ）
+- 3〜4行に収まる粒度
+- 他の銘柄の候補を混ぜない
+{note}
+{body}
+"""
+
+def valid_pick(data, items: list[dict], summaries: dict[str, dict] | None = None) -> bool:
+    """Gemini応答（1銘柄ぶん）の形式チェック（要約済み候補なら picked_index だけで可）"""
+    if not isinstance(data, dict):
+        return False
     try:
-        resp = client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
-        )
-        text = (resp.text or "").strip()
-        # JSONだけ取り出す
-        m = re.search(r"\{.*\}", text, re.DOTALL)
-        if not m:
-            return None
-        data = json.loads(m.group())
+        idx = int(data.get("picked_index"))
+    except (TypeError, ValueError):
+        return False
+    if not 1 <= idx <= len(items):
+        return False
+    if (summaries or {}).get(items[idx - 1].get("signature")):
+        return True
+    if not isinstance(data.get("title_ja"), str) or not data["title_ja"].strip():
+        return False
+    return isinstance(data.get("bullets", []), list)
+
+def apply_article_summaries(data: dict, items: list[dict], summaries: dict[str, dict],
+                            articles: ArticleSummaryStore | None) -> dict:
+    """
+    要約済み候補が選ばれたらストアの要約で補い、新しく要約された記事はストアへ保存する
+    """
+    try:
+        idx = int(data.get("picked_index", 1)) - 1
+    except (TypeError, ValueError):
         return data
+    if not 0 <= idx < len(items):
+        return data
+    picked = items[idx]
+    stored = summaries.get(picked.get("signature"))
+    if stored and not (data.get("title_ja") or "").strip():
+        return {**stored, "picked_index": idx + 1}
+    # ダミー候補（link なし）は保存しない
+    if articles is not None and picked.get("link"):
+        articles.put(picked.get("signature"), data)
+    return data
+
+def gemini_generate(prompt: str, llm_cache: LLMResponseCache | None = None) -> tuple[str | None, bool]:
+    """
+    Returns:
+        (応答テキスト, キャッシュ由来か)
+        ※ クライアントが無い / 失敗続きで遮断中なら (None, False) → 呼び出し側は強制採用にフォールバック
+    """
+    if llm_cache is not None:
+        cached = llm_cache.get(GEMINI_MODEL, prompt)
+        if cached is not None:
+            METRICS.incr("llm_cache_hits", provider="gemini")
+            return cached, True
+
+    # レート制御（RPM/TPM）+ 429/5xx はジッター付きバックオフで再試行（llm_gateway）
+    try:
+        res = get_gateway().generate("gemini", prompt, model=GEMINI_MODEL)
+    except LLMUnavailable:
+        return None, False
+    return res["text"], False
+
+def gemini_pick_one(stock_id: str, stock_name: str, bucket: str, items: list[dict],
+                    llm_cache: LLMResponseCache | None = None,
+                    articles: ArticleSummaryStore | None = None) -> dict | None:
+    summaries = articles.lookup_many(items) if articles is not None else {}
+
+    # 候補が1件だけで要約済みなら選ぶ必要も無い（Gemini呼び出しなし）
+    if len(items) == 1 and summaries.get(items[0].get("signature")):
+        return {**summaries[items[0]["signature"]], "picked_index": 1}
+
+    prompt = build_gemini_prompt(stock_id, stock_name, bucket, items, summaries)
+
+    try:
+        text, from_cache = gemini_generate(prompt, llm_cache)
+        data = extract_json(text)
+        if not data:
+            return None
+        # 解析できた応答だけキャッシュ（同じ候補なら再実行時に再利用）
+        if not from_cache and llm_cache is not None:
+            llm_cache.put(GEMINI_MODEL, prompt, text)
+        return apply_article_summaries(data, items, summaries, articles)
     except Exception as e:
         print(f"⚠️ Gemini失敗: {stock_name} - {e}", flush=True)
         return None
 
+def gemini_pick_batch(ctxs: list[dict],
+                      llm_cache: LLMResponseCache | None = None,
+                      articles: ArticleSummaryStore | None = None) -> dict[str, dict]:
+    """
+    複数銘柄を1リクエストで選定する
+
+    Returns:
+        {stock_id: 応答} ※ 形式チェックを通った銘柄のみ（欠落・不正は呼び出し側で単独リクエスト）
+    """
+    if not ctxs:
+        return {}
+
+    for c in ctxs:
+        c["summaries"] = articles.lookup_many(c["shortlist"]) if articles is not None else {}
+    prompt = build_gemini_batch_prompt(ctxs)
+    names = "/".join(c["name"] for c in ctxs)
+
+    try:
+        text, from_cache = gemini_generate(prompt, llm_cache)
+        data = extract_json(text) or {}
+    except Exception as e:
+        print(f"⚠️ Gemini一括失敗: {names} - {e}", flush=True)
+        return {}
+
+    out = {}
+    for c in ctxs:
+        sec = data.get(c["stock_id"])
+        if valid_pick(sec, c["shortlist"], c["summaries"]):
+            out[c["stock_id"]] = apply_article_summaries(sec, c["shortlist"], c["summaries"], articles)
+    # 全銘柄ぶん揃った応答だけキャッシュ
+    if len(out) == len(ctxs) and not from_cache and llm_cache is not None:
+        llm_cache.put(GEMINI_MODEL, prompt, text)
+    return out
+
+def plan_gemini_batches(ctxs: list[dict],
+                        token_budget: int = GEMINI_BATCH_TOKEN_BUDGET,
+                        max_stocks: int = GEMINI_BATCH_MAX_STOCKS) -> list[list[dict]]:
+    """候補の見積もりトークン数で貪欲に詰める（予算を超える銘柄は単独バッチ）"""
+    batches: list[list[dict]] = []
+    cur: list[dict] = []
+    cur_tokens = 0
+    for c in ctxs:
+        t = estimate_tokens(format_candidates(c["shortlist"]))
+        if cur and (cur_tokens + t > token_budget or len(cur) >= max_stocks):
+            batches.append(cur)
+            cur, cur_tokens = [], 0
+        cur.append(c)
+        cur_tokens += t
+    if cur:
+        batches.append(cur)
+    return batches
+
+def gemini_pick_all(ctxs: list[dict],
+                    llm_cache: LLMResponseCache | None = None,
+                    articles: ArticleSummaryStore | None = None) -> dict[str, dict | None]:
+    """
+    一括モード: バッチ単位で並列に投げ、欠落・不正な銘柄だけ単独リクエストで補う
+    """
+    batches = plan_gemini_batches(ctxs)
+    print(f"🤖 Gemini一括: {len(ctxs)}銘柄 → {len(batches)}リクエスト", flush=True)
+
+    picks: dict[str, dict | None] = {}
+    with ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY) as ex:
+        for got in ex.map(lambda b: gemini_pick_batch(b, llm_cache, articles), batches):
+            picks.update(got)
+
+        missing = [c for c in ctxs if c["stock_id"] not in picks]
+        if missing:
+            print(f"  単独リクエストで再取得: {', '.join(c['stock_id'] for c in missing)}", flush=True)
+        singles = ex.map(
+            lambda c: gemini_pick_one(c["stock_id"], c["name"], c["bucket"], c["shortlist"],
+                                      llm_cache, articles),
+            missing,
+        )
+        for c, gem in zip(missing, singles):
+            picks[c["stock_id"]] = gem
+    return picks
+
 
 # ==========================
 # 投資判断補助（AIなし・固定）
@@ -425,16 +813,22 @@ def investment_aux_text(stock_name: str) -> dict:
 # ==========================
 # 1銘柄ぶん組み立て（最低1本保証）
 # ==========================
-def build_one_stock_result(stock_id: str, stock_info: dict, all_news: list[dict]) -> dict:
+def prepare_stock_shortlist(stock_id: str, stock_info: dict, all_news: list[dict],
+                            index: StockKeywordIndex | None = None,
+                            now_ts: float | None = None) -> dict:
+    """候補選定〜カテゴリ決定〜Gemini用の上位候補まで（LLMは呼ばない）"""
     name = stock_info.get("name", stock_id)
-    print("="*60, flush=True)
-    print(f"📊 {name}（{stock_id}）", flush=True)
-    print("="*60, flush=True)
+    # 並列実行時にログが混ざらないよう、銘柄ごとにまとめて出力する
+    log = []
+    log.append("="*60)
+    log.append(f"📊 {name}（{stock_id}）")
+    log.append("="*60)
 
-    cands = pick_candidates_for_stock(all_news, stock_id, stock_info)
-    print(f"候補ニュース: {len(cands)}件", flush=True)
+    with METRICS.span("pick_candidates"):
+        cands = pick_candidates_for_stock(all_news, stock_id, stock_info, index=index)
+    log.append(f"候補ニュース: {len(cands)}件")
 
-    buckets = split_by_recency(cands)
+    buckets = split_by_recency(cands, now_ts=now_ts)
 
     # 探す順：today → weekly → monthly → それでもダメなら cands先頭（強制）
     chosen_bucket = None
@@ -461,10 +855,37 @@ def build_one_stock_result(stock_id: str, stock_info: dict, all_news: list[dict]
             "signature": hashlib.md5(f"{stock_id}-{time.time()}".encode()).hexdigest()
         }]
 
-    # Geminiに投げる候補は上位10件
-    shortlist = chosen_list[:10]
+    # 関連度（TF-IDF: 銘柄プロファイル + 遅れても価値がある類型）で並べ替え、上位を少なめに渡す
+    # NumPy が無ければ従来どおり新しい順に上位10件
+    ranked = rank_candidates(chosen_list, stock_id, stock_info, now_ts=now_ts)
+    if ranked is not None:
+        chosen_list = [n for _, n in ranked][:RELEVANCE_SHORTLIST]
+        if ranked:
+            log.append(f"関連度ランキング: {len(ranked)}件 → 上位{len(chosen_list)}件"
+                       f"（最高 {ranked[0][0]:.3f} / 最低採用 {ranked[len(chosen_list) - 1][0]:.3f}）")
+
+    # Geminiに投げる候補は上位10件（さらに見積もりトークン予算に収まるところまで）
+    shortlist, fit = fit_candidates(chosen_list[:10])
+    log.append(
+        f"プロンプト候補: {fit['kept']}件（予算超過で除外 {fit['dropped']}件）"
+        f" / 見積もり {fit['tokens']} tokens（圧縮で約 {fit['saved']} tokens 削減）"
+    )
+    METRICS.incr("prompt_tokens_saved_est", fit["saved"])
+
+    return {
+        "stock_id": stock_id,
+        "stock_info": stock_info,
+        "name": name,
+        "bucket": chosen_bucket,
+        "shortlist": shortlist,
+        "log": log,
+    }
+
+def finalize_stock_result(ctx: dict, gem: dict | None) -> dict:
+    """Gemini応答（None ならフォールバック）から1銘柄ぶんの結果を組み立てる"""
+    stock_id, stock_info, name = ctx["stock_id"], ctx["stock_info"], ctx["name"]
+    chosen_bucket, shortlist, log = ctx["bucket"], ctx["shortlist"], ctx["log"]
 
-    gem = gemini_pick_one(stock_id, name, chosen_bucket, shortlist)
     if gem:
         idx = int(gem.get("picked_index", 1)) - 1
         idx = max(0, min(idx, len(shortlist)-1))
@@ -480,7 +901,7 @@ def build_one_stock_result(stock_id: str, stock_info: dict, all_news: list[dict]
             "bucket": chosen_bucket,
             "is_aux": False,
         }
-        print(f"✅ 採用: {chosen_bucket} / Gemini選定", flush=True)
+        log.append(f"✅ 採用: {chosen_bucket} / Gemini選定")
     else:
         # Gemini失敗時のフォールバック（最低品質保証）
         picked = shortlist[0]
@@ -495,7 +916,7 @@ def build_one_stock_result(stock_id: str, stock_info: dict, all_news: list[dict]
             "bucket": chosen_bucket,
             "is_aux": False,
         }
-        print(f"⚠️ 採用: {chosen_bucket} / Gemini未使用（フォールバック）", flush=True)
+        log.append(f"⚠️ 採用: {chosen_bucket} / Gemini未使用（フォールバック）")
 
     # 1銘柄 = [ニュース1本] + [投資判断補助1本]
     # ※「必ずニュース1本」の要件を満たしつつ、補助は常に追加
@@ -505,8 +926,18 @@ def build_one_stock_result(stock_id: str, stock_info: dict, all_news: list[dict]
         "business_type": stock_info.get("business_type", ""),
         "items": [news_item, investment_aux_text(name)],
     }
+    print_block(log)
     return out
 
+def build_one_stock_result(stock_id: str, stock_info: dict, all_news: list[dict],
+                           index: StockKeywordIndex | None = None,
+                           now_ts: float | None = None,
+                           llm_cache: LLMResponseCache | None = None,
+                           articles: ArticleSummaryStore | None = None) -> dict:
+    ctx = prepare_stock_shortlist(stock_id, stock_info, all_news, index=index, now_ts=now_ts)
+    gem = gemini_pick_one(stock_id, ctx["name"], ctx["bucket"], ctx["shortlist"], llm_cache, articles)
+    return finalize_stock_result(ctx, gem)
+
 
 # ==========================
 # メール送信
@@ -520,8 +951,11 @@ def send_email(render_data: list[dict], now_taipei: datetime):
         return
 
     from email_template_v5 import generate_html_email  # ローカルファイル
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Mail
 
-    html_content = generate_html_email(render_data, now_taipei, VERSION)
+    with METRICS.span("render_email"):
+        html_content = generate_html_email(render_data, now_taipei, VERSION)
 
     to_list = [EMAIL_TO]
     cc_list = []
@@ -539,9 +973,11 @@ def send_email(render_data: list[dict], now_taipei: datetime):
 
     try:
         sg = SendGridAPIClient(SENDGRID_API_KEY)
-        resp = sg.send(message)
+        with METRICS.span("send_email"):
+            resp = sg.send(message)
         print(f"✅ メール送信成功（ステータス: {resp.status_code}）", flush=True)
     except Exception as e:
+        METRICS.incr("email_errors")
         print(f"❌ メール送信エラー: {e}", flush=True)
 
 
@@ -554,17 +990,66 @@ def main():
         print("❌ stocks.json の銘柄が空です。stocks.json を確認してください。", flush=True)
         return
 
-    # RSS収集（広めに取って、銘柄側で today/weekly/monthly に分類）
-    all_news = collect_news_parallel(max_entries_per_feed=30)
+    # 別名テーブルを照合器にコンパイル（全銘柄ぶん1回だけ）
+    matcher = build_stock_matcher(STOCKS)
 
-    results: list[dict] = []
-    for sid, sinfo in STOCKS.items():
-        results.append(build_one_stock_result(sid, sinfo, all_news))
+    # RSS収集（広めに取って、銘柄側で today/weekly/monthly に分類）
+    cache = NewsCache()
+    with METRICS.span("collect_news"):
+        all_news = collect_news_parallel(max_entries_per_feed=30, cache=cache, matcher=matcher)
+    cache.save()
+
+    # 全銘柄のキーワードを1回で照合（銘柄ごとの総当たり走査をしない）
+    with METRICS.span("keyword_index"):
+        index = matcher.index(all_news)
+
+    # today/weekly/monthly の境界は全銘柄で同じ基準時刻を使う
+    run_now_ts = time.time()
+
+    # 同じ候補（= 同じプロンプト）の LLM 応答は topic_retention_days の間再利用
+    llm_cache = LLMResponseCache(cache)
+    # 記事ごとの日本語タイトル・要点は銘柄・日付をまたいで再利用（要約は未要約の記事だけ）
+    articles = ArticleSummaryStore(cache)
+
+    with METRICS.span("pick_stocks"):
+        if GEMINI_BATCH_MODE:
+            # 一括モード: 全銘柄の候補を先に作り、複数銘柄を1リクエストにまとめて選定
+            ctxs = [prepare_stock_shortlist(sid, sinfo, all_news, index=index, now_ts=run_now_ts)
+                    for sid, sinfo in STOCKS.items()]
+            picks = gemini_pick_all(ctxs, llm_cache, articles)
+            results: list[dict] = [finalize_stock_result(c, picks.get(c["stock_id"])) for c in ctxs]
+        else:
+            # 銘柄は並列処理（Gemini の RPM/TPM・同時実行数は llm_gateway が共有制御）。結果は STOCKS の順
+            with ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY) as ex:
+                results = list(ex.map(
+                    lambda kv: build_one_stock_result(kv[0], kv[1], all_news, index=index,
+                                                      now_ts=run_now_ts, llm_cache=llm_cache,
+                                                      articles=articles),
+                    STOCKS.items(),
+                ))
+
+    llm_cache.prune()
+    articles.prune()
+    print(llm_cache.summary(), flush=True)
+    print(articles.summary(), flush=True)
+    print(get_gateway().summary(), flush=True)
+    cache.save()
+    # 保持日数を過ぎたレコードを削除（cache_policy）
+    removed = cache.compact()
+    if removed:
+        print(f"  キャッシュ整理: {removed}件削除", flush=True)
+    cache.close()
 
     now_taipei = datetime.now(TW_TZ)
     print("\n📧 メール送信中...", flush=True)
     send_email(results, now_taipei)
 
+    # NEWS_METRICS_DIR が設定されていれば段階別の所要時間・件数を書き出す
+    if METRICS.enabled:
+        print(METRICS.summary(), flush=True)
+        for path in METRICS.write_reports():
+            print(f"  計測結果: {path}", flush=True)
+
 
 if __name__ == "__main__":
     main()
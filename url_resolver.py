@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+リダイレクト解決キャッシュ
+- RSSリンク（news.google.com/rss/articles/...）→ 最終URL の対応を v5 キャッシュの
+  url_to_signature セクションに永続化
+- 成功結果は news_retention_days（system_config.json）まで再利用
+- 失敗（リンク切れ・タイムアウト）も短いTTLでキャッシュし、毎回の再HEADを防ぐ
+- 件数上限を超えたら確認日時の古い順に削除
+- Google News の記事ID（CBMi... 形式）はネットワークなしで掲載元URLに復号
+"""
+
+import time
+import base64
+import binascii
+import threading
+from urllib.parse import urlparse
+
+from news_cache import NewsCache, retention_sec
+
+URL_CACHE_SECTION = "url_to_signature"
+URL_CACHE_NEGATIVE_TTL_SEC = 6 * 3600     # 失敗結果の保持（6時間）
+URL_CACHE_MAX_ENTRIES = 20000
+
+
+class UrlResolutionCache:
+    """
+    RSSリンク → 最終URL のキャッシュ
+
+    値の形式: {"final_url": str | None, "checked_at": epoch秒}
+    final_url=None は「解決失敗」のネガティブキャッシュ
+    """
+
+    def __init__(self, cache: NewsCache,
+                 ttl_sec: int | None = None,
+                 negative_ttl_sec: int = URL_CACHE_NEGATIVE_TTL_SEC,
+                 max_entries: int = URL_CACHE_MAX_ENTRIES):
+        self.cache = cache
+        self.ttl_sec = ttl_sec if ttl_sec is not None else retention_sec("news_retention_days", 30)
+        self.negative_ttl_sec = negative_ttl_sec
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, rec: dict, now: float) -> bool:
+        ttl = self.ttl_sec if rec.get("final_url") else self.negative_ttl_sec
+        return now - float(rec.get("checked_at", 0)) > ttl
+
+    def lookup(self, url: str) -> tuple[bool, str | None]:
+        """
+        Returns:
+            (hit, final_url)  ※ hit=True かつ final_url=None は「既知の失敗」
+        """
+        rec = self.cache.get(URL_CACHE_SECTION, url)
+        if isinstance(rec, dict) and not self._expired(rec, time.time()):
+            with self._lock:
+                if rec.get("final_url"):
+                    self.hits += 1
+                else:
+                    self.negative_hits += 1
+            return True, rec.get("final_url")
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def store(self, url: str, final_url: str | None):
+        self.cache.put(URL_CACHE_SECTION, url, {
+            "final_url": final_url,
+            "checked_at": time.time(),
+        })
+
+    def prune(self) -> int:
+        """期限切れを削除し、上限超過分を古い順に削除する。削除件数を返す"""
+        now = time.time()
+        records = self.cache.items(URL_CACHE_SECTION)
+        removed = 0
+        alive = []
+        for url, rec in records:
+            if not isinstance(rec, dict) or self._expired(rec, now):
+                self.cache.delete(URL_CACHE_SECTION, url)
+                removed += 1
+            else:
+                alive.append((float(rec.get("checked_at", 0)), url))
+        overflow = len(alive) - self.max_entries
+        if overflow > 0:
+            alive.sort()
+            for _, url in alive[:overflow]:
+                self.cache.delete(URL_CACHE_SECTION, url)
+                removed += 1
+        return removed
+
+    def summary(self) -> str:
+        return (f"URLキャッシュ: ヒット {self.hits} / 失敗ヒット {self.negative_hits}"
+                f" / ミス {self.misses}")
+
+
+# ==========================
+# Google News 記事IDのオフライン復号
+# ==========================
+GOOGLE_NEWS_HOSTS = ("news.google.com",)
+
+# 新形式（AU_yqL...）は署名付きでサーバー問い合わせが必要なため復号不可
+_UNDECODABLE_PREFIX = b"AU_yqL"
+
+_decode_lock = threading.Lock()
+DECODE_STATS = {"hit": 0, "miss": 0}
+
+
+def is_google_news_article(url: str) -> bool:
+    try:
+        p = urlparse(url)
+    except Exception:
+        return False
+    return p.netloc.lower() in GOOGLE_NEWS_HOSTS and "/articles/" in p.path
+
+
+def _read_varint(buf: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError("truncated varint")
+        b = buf[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _first_url_field(buf: bytes) -> str | None:
+    """protobuf のトップレベルを走査し、http(s) で始まる最初の length-delimited フィールドを返す"""
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        wire = key & 0x07
+        if wire == 0:
+            _, pos = _read_varint(buf, pos)
+        elif wire == 2:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+            if value.startswith(_UNDECODABLE_PREFIX):
+                return None
+            if value.startswith((b"http://", b"https://")):
+                return value.decode("utf-8")
+        elif wire == 1:
+            pos += 8
+        elif wire == 5:
+            pos += 4
+        else:
+            return None
+    return None
+
+
+def decode_google_news_url(url: str) -> str | None:
+    """
+    news.google.com/rss/articles/<ID> から掲載元URLを取り出す
+    復号できない（新形式・破損）場合は None（呼び出し側でネットワーク解決にフォールバック）
+    """
+    if not is_google_news_article(url):
+        return None
+
+    article_id = urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+    decoded = None
+    try:
+        raw = base64.urlsafe_b64decode(article_id + "=" * (-len(article_id) % 4))
+        decoded = _first_url_field(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        decoded = None
+
+    with _decode_lock:
+        DECODE_STATS["hit" if decoded else "miss"] += 1
+    return decoded
+
+
+def decode_summary() -> str:
+    with _decode_lock:
+        hit, miss = DECODE_STATS["hit"], DECODE_STATS["miss"]
+    return f"Google News復号: ヒット {hit} / ミス {miss}（ミスはHEADで解決）"